@@ -0,0 +1,93 @@
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIHandler
+from django.db import close_old_connections
+from django.urls import URLPattern
+
+ASYNC_ROUTES = (
+    'recipes-list',
+    'recipes-detail',
+    'recipes-download-shopping-cart',
+    'tags-list',
+    'ingredients-list',
+)
+
+END = object()
+
+
+def run_view(view, request, *args, **kwargs):
+    close_old_connections()
+    try:
+        response = view(request, *args, **kwargs)
+        if hasattr(response, 'render'):
+            response.render()
+        return response
+    finally:
+        close_old_connections()
+
+
+def async_view(view):
+    run = sync_to_async(run_view, thread_sensitive=False)
+
+    async def wrapper(request, *args, **kwargs):
+        return await run(view, request, *args, **kwargs)
+
+    wrapper.csrf_exempt = True
+    return wrapper
+
+
+def async_routes(urls):
+    """Оборачивает маршруты роутера из ASYNC_ROUTES в async_view.
+
+    Колбэки роутера несут initkwargs @action (renderer_classes,
+    permission_classes), поэтому они оборачиваются, а не собираются заново.
+    """
+    return [
+        URLPattern(
+            url.pattern, async_view(url.callback), url.default_args, url.name
+        )
+        if url.name in ASYNC_ROUTES else url
+        for url in urls
+    ]
+
+
+class StreamingASGIHandler(ASGIHandler):
+    """Отдаёт потоковые ответы, не перебирая их в цикле событий.
+
+    Django 3.2 читает streaming_content прямо в цикле событий, где
+    генератор с курсором БД падает с SynchronousOnlyOperation. Здесь
+    каждый кусок читается в потоке для синхронного кода, так что
+    выгрузка списка покупок уходит клиенту по мере генерации.
+    """
+
+    async def send_response(self, response, send):
+        if not response.streaming:
+            return await super().send_response(response, send)
+        headers = [
+            (
+                header.encode('ascii') if isinstance(header, str) else header,
+                value.encode('latin1') if isinstance(value, str) else value
+            )
+            for header, value in response.items()
+        ]
+        headers.extend(
+            (b'Set-Cookie', cookie.output(header='').encode('ascii').strip())
+            for cookie in response.cookies.values()
+        )
+        await send({
+            'type': 'http.response.start',
+            'status': response.status_code,
+            'headers': headers,
+        })
+        read = sync_to_async(next, thread_sensitive=True)
+        parts = iter(response)
+        part = await read(parts, END)
+        while part is not END:
+            for chunk, _ in self.chunk_bytes(part):
+                await send({
+                    'type': 'http.response.body',
+                    'body': chunk,
+                    'more_body': True,
+                })
+            part = await read(parts, END)
+        await send({'type': 'http.response.body'})
+        await sync_to_async(response.close, thread_sensitive=True)()
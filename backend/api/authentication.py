@@ -0,0 +1,102 @@
+from collections import OrderedDict
+from copy import copy
+from threading import Lock
+from time import time, time_ns
+
+from django.conf import settings
+from django.core.cache import cache
+from recipes import feed_cache
+from rest_framework.authentication import TokenAuthentication
+
+
+def token_key(key):
+    return f'auth:token:{key}'
+
+
+def user_version_key(user_id):
+    return f'auth:user_version:{user_id}'
+
+
+def user_version(user_id):
+    key = user_version_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time_ns(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+class TokenCache:
+    def __init__(self):
+        self._lock = Lock()
+        self._entries = OrderedDict()
+
+    @property
+    def enabled(self):
+        # Версии пользователей должны быть видны всем воркерам, иначе
+        # выход или смена пароля не дойдут до LRU других процессов.
+        return feed_cache.is_shared()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+        if entry is None and settings.TOKEN_CACHE_SHARED:
+            entry = cache.get(token_key(key))
+            if entry is not None:
+                with self._lock:
+                    self._entries[key] = entry
+        if entry is None:
+            return None
+        user, token, version, expires = entry
+        if expires < time() or version != user_version(user.pk):
+            self.discard(key)
+            return None
+        return copy(user), token
+
+    def set(self, key, user, token):
+        entry = (
+            user,
+            token,
+            user_version(user.pk),
+            time() + settings.TOKEN_CACHE_TTL
+        )
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > settings.TOKEN_CACHE_SIZE:
+                self._entries.popitem(last=False)
+        if settings.TOKEN_CACHE_SHARED:
+            cache.set(token_key(key), entry, settings.TOKEN_CACHE_TTL)
+
+    def discard(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+        if settings.TOKEN_CACHE_SHARED:
+            cache.delete(token_key(key))
+
+    def discard_user(self, user_id):
+        try:
+            cache.incr(user_version_key(user_id))
+        except ValueError:
+            cache.set(user_version_key(user_id), time_ns(), timeout=None)
+        with self._lock:
+            for key, entry in list(self._entries.items()):
+                if entry[0].pk == user_id:
+                    del self._entries[key]
+
+
+token_cache = TokenCache()
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    def authenticate_credentials(self, key):
+        if not token_cache.enabled:
+            return super().authenticate_credentials(key)
+        cached = token_cache.get(key)
+        if cached is not None:
+            return cached
+        user, token = super().authenticate_credentials(key)
+        token_cache.set(key, user, token)
+        return user, token
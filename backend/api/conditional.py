@@ -0,0 +1,83 @@
+from hashlib import md5
+
+from recipes.models import Recipe, TableVersion
+
+TAGS = TableVersion.TAGS
+INGREDIENTS = TableVersion.INGREDIENTS
+
+
+def make_etag(*parts):
+    return md5(':'.join(map(str, parts)).encode()).hexdigest()
+
+
+def latest(*dates):
+    dates = [date for date in dates if date is not None]
+    return max(dates) if dates else None
+
+
+def recipe_state(request, pk):
+    if hasattr(request, '_recipe_state'):
+        return request._recipe_state
+    recipe = Recipe.objects.with_user_flags(request.user).filter(
+        pk=pk
+    ).values(
+        'updated_at',
+        'is_favorited',
+        'is_in_shopping_cart',
+        'author_is_subscribed'
+    ).first()
+    request._recipe_state = (
+        recipe,
+        TableVersion.stamps(TAGS, INGREDIENTS)
+    )
+    return request._recipe_state
+
+
+def recipe_etag(request, pk=None):
+    recipe, stamps = recipe_state(request, pk)
+    if recipe is None:
+        return None
+    return make_etag(
+        pk,
+        recipe['updated_at'].isoformat(),
+        recipe['is_favorited'],
+        recipe['is_in_shopping_cart'],
+        recipe['author_is_subscribed'],
+        *sorted(stamps.items())
+    )
+
+
+def recipe_last_modified(request, pk=None):
+    if request.user.is_authenticated:
+        return None
+    recipe, stamps = recipe_state(request, pk)
+    if recipe is None:
+        return None
+    return latest(
+        recipe['updated_at'],
+        *(updated_at for _, updated_at in stamps.values())
+    )
+
+
+def table_stamp(request, name):
+    if not hasattr(request, '_table_stamps'):
+        request._table_stamps = {}
+    if name not in request._table_stamps:
+        request._table_stamps[name] = TableVersion.stamps(name).get(
+            name, (0, None)
+        )
+    return request._table_stamps[name]
+
+
+def table_etag(name):
+    def etag(request, *args, **kwargs):
+        version, _ = table_stamp(request, name)
+        return make_etag(name, version, request.GET.urlencode())
+    return etag
+
+
+def table_last_modified(name):
+    def last_modified(request, *args, **kwargs):
+        _, updated_at = table_stamp(request, name)
+        return updated_at
+    return last_modified
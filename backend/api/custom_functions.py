@@ -1,20 +1,69 @@
+import csv
 from dataclasses import dataclass
+from itertools import chain
+from typing import Iterable
+
+from .pdf import PDFWriter
+
+TOPIC = 'Список покупок для приготовления:\n'
+CSV_HEADER = ('Ингредиент', 'Количество', 'Единица измерения')
 
 
 @dataclass
 class Attachment:
     name: str
-    body: str
+    body: Iterable[str]
+    content_type: str
+
+
+class EchoBuffer:
+    def write(self, value):
+        return value
+
+
+def ingredient_line(ingredient):
+    name = ingredient.get('ingredient__name')
+    amount = ingredient.get('ingredient_amount')
+    measurement = ingredient.get('ingredient__measurement_unit')
+    return f'{name}: {amount}, {measurement}'
+
+
+def generate_txt(recipe_names, ingredients):
+    yield TOPIC + ', '.join(recipe_names)
+    for ingredient in ingredients:
+        yield '\n' + ingredient_line(ingredient)
 
 
-def generate_attachment(user_name, recipes, ingredients) -> Attachment:
-    file_name = str(user_name) + '_ingredients.txt'
-    topic = 'Список покупок для приготовления:\n'
-    body = topic + ', '.join(recipe.name for recipe in recipes)
+def generate_csv(recipe_names, ingredients):
+    writer = csv.writer(EchoBuffer())
+    yield writer.writerow(CSV_HEADER)
     for ingredient in ingredients:
-        name = ingredient.get('ingredient__name')
-        amount = ingredient.get('ingredient_amount')
-        measurement = ingredient.get('ingredient__measurement_unit')
-        body += ''.join(f'\n{name}: {amount}, {measurement}')
+        yield writer.writerow((
+            ingredient.get('ingredient__name'),
+            ingredient.get('ingredient_amount'),
+            ingredient.get('ingredient__measurement_unit')
+        ))
+
+
+def generate_pdf(recipe_names, ingredients):
+    yield from PDFWriter().render(chain(
+        (TOPIC.rstrip(), ', '.join(recipe_names), ''),
+        map(ingredient_line, ingredients)
+    ))
+
+
+GENERATORS = {
+    'txt': (generate_txt, 'text/plain; charset=utf-8'),
+    'csv': (generate_csv, 'text/csv; charset=utf-8'),
+    'pdf': (generate_pdf, 'application/pdf'),
+}
+
 
-    return Attachment(name=file_name, body=body)
+def generate_attachment(user_name, recipe_names, ingredients,
+                        file_format='txt') -> Attachment:
+    generator, content_type = GENERATORS[file_format]
+    return Attachment(
+        name=f'{user_name}_ingredients.{file_format}',
+        body=generator(recipe_names, ingredients),
+        content_type=content_type
+    )
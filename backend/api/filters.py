@@ -1,6 +1,8 @@
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db.models import F
 from django_filters.filters import CharFilter, ModelMultipleChoiceFilter
 from django_filters.rest_framework.filterset import BooleanFilter, FilterSet
-from recipes.models import Ingredient, Recipe, Tag
+from recipes.models import SEARCH_CONFIG, Ingredient, Recipe, Tag
 
 
 class RecipeFilter(FilterSet):
@@ -15,6 +17,9 @@ class RecipeFilter(FilterSet):
     is_in_shopping_cart = BooleanFilter(
         method='get_is_in_shopping_cart'
     )
+    search = CharFilter(
+        method='get_search'
+    )
 
     class Meta:
         model = Recipe
@@ -23,15 +28,27 @@ class RecipeFilter(FilterSet):
     def get_is_favorited(self, queryset, field_name, value):
         user = self.request.user
         if user.is_authenticated and value:
-            return queryset.filter(favorited_by__user=user)
+            return queryset.filter(is_favorited=True)
         return queryset
 
     def get_is_in_shopping_cart(self, queryset, field_name, value):
         user = self.request.user
         if user.is_authenticated and value:
-            return queryset.filter(in_shopping_cart__user=user)
+            return queryset.filter(is_in_shopping_cart=True)
         return queryset
 
+    def get_search(self, queryset, field_name, value):
+        if not value:
+            return queryset
+        query = SearchQuery(
+            value,
+            config=SEARCH_CONFIG,
+            search_type='websearch'
+        )
+        return queryset.filter(search_vector=query).annotate(
+            rank=SearchRank(F('search_vector'), query)
+        ).order_by('-rank', '-publication_date', '-id')
+
 
 class IngredienFilter(FilterSet):
     name = CharFilter(lookup_expr='startswith')
@@ -0,0 +1,140 @@
+import json
+from statistics import median, quantiles
+from tempfile import TemporaryDirectory
+from time import perf_counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from recipes.models import Ingredient, Recipe, Tag
+from rest_framework.authtoken.models import Token
+from users.models import User
+
+IMAGE = (
+    'data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAA'
+    'DUlEQVR42mNkYPhfDwAChwGA60e6kgAAAABJRU5ErkJggg=='
+)
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Измеряет задержки и число SQL-запросов основных эндпоинтов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=100)
+        parser.add_argument('--output', help='Файл для JSON-отчёта')
+
+    def handle(self, *args, **options):
+        user = User.objects.filter(
+            subscriptions__isnull=False,
+            shopping_cart__isnull=False
+        ).first()
+        recipe = Recipe.objects.filter(author=user).first() or (
+            Recipe.objects.first()
+        )
+        if user is None or recipe is None:
+            raise CommandError(
+                'Нет данных: сначала выполните manage.py generate_data'
+            )
+        token, _ = Token.objects.get_or_create(user=user)
+        host = settings.ALLOWED_HOSTS[0]
+        anonymous = Client(HTTP_HOST=host)
+        client = Client(
+            HTTP_HOST=host,
+            HTTP_AUTHORIZATION=f'Token {token.key}'
+        )
+        tag = Tag.objects.first()
+        payload = {
+            'ingredients': [
+                {'id': pk, 'amount': 10}
+                for pk in Ingredient.objects.values_list('pk', flat=True)[:10]
+            ],
+            'tags': [tag.pk],
+            'image': IMAGE,
+            'name': 'Рецепт для замера',
+            'text': 'Описание',
+            'cooking_time': 10,
+        }
+        endpoints = (
+            ('feed_anonymous', anonymous.get, '/api/recipes/', {}),
+            ('feed', client.get, '/api/recipes/', {}),
+            (
+                'feed_filtered',
+                client.get,
+                f'/api/recipes/?tags={tag.slug}&is_favorited=1&limit=20',
+                {}
+            ),
+            ('feed_cursor', client.get, '/api/recipes/?pagination=cursor', {}),
+            ('detail', client.get, f'/api/recipes/{recipe.pk}/', {}),
+            (
+                'subscriptions',
+                client.get,
+                '/api/users/subscriptions/?recipes_limit=3',
+                {}
+            ),
+            (
+                'download_shopping_cart',
+                client.get,
+                '/api/recipes/download_shopping_cart/',
+                {}
+            ),
+            (
+                'create',
+                client.post,
+                '/api/recipes/',
+                {'data': payload, 'content_type': 'application/json'}
+            ),
+            (
+                'update',
+                client.patch,
+                f'/api/recipes/{recipe.pk}/',
+                {'data': payload, 'content_type': 'application/json'}
+            ),
+        )
+        report = {}
+        with TemporaryDirectory() as media:
+            with override_settings(MEDIA_ROOT=media):
+                for name, method, url, kwargs in endpoints:
+                    report[name] = self.measure(
+                        method,
+                        url,
+                        kwargs,
+                        options['requests']
+                    )
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as report_file:
+                report_file.write(output)
+        self.stdout.write(output)
+
+    def measure(self, method, url, kwargs, requests):
+        timings, queries, statuses = [], [], set()
+        try:
+            with transaction.atomic():
+                for _ in range(requests):
+                    with CaptureQueriesContext(connection) as captured:
+                        started = perf_counter()
+                        response = method(url, **kwargs)
+                        if response.streaming:
+                            b''.join(response.streaming_content)
+                        timings.append((perf_counter() - started) * 1000)
+                    queries.append(len(captured))
+                    statuses.add(response.status_code)
+                raise Rollback
+        except Rollback:
+            pass
+        percentiles = quantiles(timings, n=100)
+        return {
+            'statuses': sorted(statuses),
+            'throughput': round(len(timings) / sum(timings) * 1000, 1),
+            'p50_ms': round(percentiles[49], 2),
+            'p95_ms': round(percentiles[94], 2),
+            'p99_ms': round(percentiles[98], 2),
+            'queries_median': median(queries),
+            'queries_max': max(queries),
+        }
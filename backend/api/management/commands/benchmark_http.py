@@ -0,0 +1,55 @@
+import json
+from concurrent.futures import ThreadPoolExecutor
+from statistics import quantiles
+from time import perf_counter
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
+
+from django.core.management.base import BaseCommand
+
+
+def fetch(url, headers):
+    started = perf_counter()
+    try:
+        with urlopen(Request(url, headers=headers)) as response:
+            while response.read(64 * 1024):
+                pass
+            status = response.status
+    except HTTPError as error:
+        status = error.code
+    return status, (perf_counter() - started) * 1000
+
+
+class Command(BaseCommand):
+    help = 'Нагружает запущенный сервер и выводит задержки в JSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('urls', nargs='+')
+        parser.add_argument('--requests', type=int, default=500)
+        parser.add_argument('--concurrency', type=int, default=16)
+        parser.add_argument('--token', help='Токен для авторизации')
+
+    def handle(self, *args, **options):
+        headers = {}
+        if options['token']:
+            headers['Authorization'] = f'Token {options["token"]}'
+        report = {}
+        with ThreadPoolExecutor(options['concurrency']) as executor:
+            for url in options['urls']:
+                started = perf_counter()
+                results = list(executor.map(
+                    lambda _: fetch(url, headers),
+                    range(options['requests'])
+                ))
+                elapsed = perf_counter() - started
+                timings = sorted(timing for _, timing in results)
+                percentiles = quantiles(timings, n=100)
+                report[url] = {
+                    'requests': len(results),
+                    'errors': sum(status >= 400 for status, _ in results),
+                    'throughput': round(len(results) / elapsed, 1),
+                    'p50_ms': round(percentiles[49], 2),
+                    'p95_ms': round(percentiles[94], 2),
+                    'p99_ms': round(percentiles[98], 2),
+                }
+        self.stdout.write(json.dumps(report, indent=2))
@@ -0,0 +1,138 @@
+import json
+import os
+import socket
+import subprocess
+import sys
+from statistics import median
+from tempfile import NamedTemporaryFile
+from time import perf_counter, sleep
+
+from api.management.commands.benchmark_http import fetch
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+# Без --config gunicorn сам подхватит gunicorn.conf.py из рабочей
+# директории, поэтому базовый профиль запускается с пустым конфигом.
+PROFILES = {
+    'baseline': '{empty}',
+    'tuned': 'gunicorn.conf.py',
+}
+
+
+def timed(action, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = perf_counter()
+        action()
+        timings.append((perf_counter() - started) * 1000)
+    return round(median(timings), 3)
+
+
+def select_one():
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT 1')
+
+
+def reconnect_and_select():
+    connection.close()
+    connection.ensure_connection()
+    select_one()
+
+
+def wait_for_port(host, port, timeout):
+    deadline = perf_counter() + timeout
+    while perf_counter() < deadline:
+        try:
+            socket.create_connection((host, port), timeout=1).close()
+            return
+        except OSError:
+            sleep(0.05)
+    raise CommandError(f'Сервер не открыл порт {port} за {timeout} с')
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает стоимость соединения с БД и задержку первых запросов '
+        'для запуска gunicorn по умолчанию и с gunicorn.conf.py'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'paths',
+            nargs='*',
+            default=['/api/recipes/', '/api/ingredients/?name=%D0%B0']
+        )
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--workers', type=int, default=2)
+        parser.add_argument(
+            '--cold',
+            type=int,
+            default=20,
+            help='Сколько первых запросов считать холодными'
+        )
+        parser.add_argument('--requests', type=int, default=200)
+        parser.add_argument('--repeat', type=int, default=50)
+        parser.add_argument('--output', help='Файл для JSON-отчёта')
+
+    def handle(self, *args, **options):
+        report = {
+            'connection': {
+                'connect_and_select_ms': timed(
+                    reconnect_and_select, options['repeat']
+                ),
+                'persistent_select_ms': timed(
+                    select_one, options['repeat']
+                ),
+            }
+        }
+        for profile in PROFILES:
+            report[profile] = self.run_server(profile, options)
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                file.write(output)
+        self.stdout.write(output)
+
+    def run_server(self, profile, options):
+        bind = f'127.0.0.1:{options["port"]}'
+        environment = dict(os.environ)
+        if profile == 'baseline':
+            environment['CONN_MAX_AGE'] = '0'
+            environment['CONN_HEALTH_CHECKS'] = 'False'
+        headers = {'Host': settings.ALLOWED_HOSTS[0]}
+        urls = [f'http://{bind}{path}' for path in options['paths']]
+        with NamedTemporaryFile(suffix='.py') as empty:
+            started = perf_counter()
+            server = subprocess.Popen(
+                [
+                    sys.executable, '-m', 'gunicorn',
+                    '--config', PROFILES[profile].format(empty=empty.name),
+                    '--bind', bind,
+                    '--workers', str(options['workers']),
+                    'backend.wsgi'
+                ],
+                cwd=settings.BASE_DIR,
+                env=environment,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL
+            )
+            try:
+                wait_for_port('127.0.0.1', options['port'], timeout=60)
+                ready = perf_counter()
+                results = [
+                    fetch(urls[number % len(urls)], headers)
+                    for number in range(options['requests'])
+                ]
+            finally:
+                server.terminate()
+                server.wait()
+        cold = [timing for _, timing in results[:options['cold']]]
+        warm = [timing for _, timing in results[options['cold']:]]
+        return {
+            'port_open_ms': round((ready - started) * 1000, 2),
+            'first_request_ms': round(cold[0], 2),
+            'cold_p50_ms': round(median(cold), 2),
+            'warm_p50_ms': round(median(warm), 2) if warm else None,
+            'errors': sum(status >= 400 for status, _ in results),
+        }
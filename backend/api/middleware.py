@@ -0,0 +1,97 @@
+import json
+import logging
+from collections import Counter
+from contextlib import ExitStack
+from time import perf_counter
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+
+class RequestProfile:
+    def __init__(self):
+        self.started = perf_counter()
+        self.view_started = None
+        self.view_finished = None
+        self.db_time = 0
+        self.queries = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += perf_counter() - started
+            self.queries[sql] += 1
+
+    @property
+    def duplicates(self):
+        return sum(count - 1 for count in self.queries.values())
+
+    def metrics(self):
+        finished = perf_counter()
+        view_started = self.view_started or self.started
+        view_finished = self.view_finished or finished
+        return {
+            'db': self.db_time * 1000,
+            'serialize': max(
+                view_finished - view_started - self.db_time, 0
+            ) * 1000,
+            'render': (finished - view_finished) * 1000,
+            'total': (finished - self.started) * 1000,
+        }
+
+
+class RequestProfilingMiddleware:
+    def __init__(self, get_response):
+        if not settings.REQUEST_PROFILING:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        profile = request._profile = RequestProfile()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(profile))
+            response = self.get_response(request)
+        if response.streaming:
+            # Тело потокового ответа строится уже после возврата из
+            # middleware: его запросы и время сюда не попадают.
+            return response
+        metrics = profile.metrics()
+        query_count = sum(profile.queries.values())
+        timings = [
+            f'{name};dur={duration:.1f}'
+            for name, duration in metrics.items()
+        ]
+        timings[0] += (
+            f';desc="{query_count} queries, {profile.duplicates} duplicates"'
+        )
+        response['Server-Timing'] = ', '.join(timings)
+        if metrics['total'] >= settings.REQUEST_PROFILING_SLOW_MS:
+            logger.warning(json.dumps({
+                'method': request.method,
+                'path': request.get_full_path(),
+                'status': response.status_code,
+                'queries': query_count,
+                'duplicates': profile.duplicates,
+                'timings_ms': {
+                    name: round(duration, 1)
+                    for name, duration in metrics.items()
+                },
+                'repeated_sql': [
+                    sql for sql, count in profile.queries.most_common(3)
+                    if count > 1
+                ],
+            }, ensure_ascii=False))
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request._profile.view_started = perf_counter()
+
+    def process_template_response(self, request, response):
+        request._profile.view_finished = perf_counter()
+        return response
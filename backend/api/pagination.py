@@ -1,6 +1,25 @@
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.pagination import CursorPagination, PageNumberPagination
 
 
 class FoodgramPagination(PageNumberPagination):
     page_size = 6
     page_size_query_param = 'limit'
+
+
+class FoodgramCursorPagination(CursorPagination):
+    page_size = 6
+    page_size_query_param = 'limit'
+    ordering = ('-publication_date', '-id')
+
+    @classmethod
+    def is_requested(cls, request):
+        return (
+            cls.cursor_query_param in request.query_params
+            or request.query_params.get('pagination') == 'cursor'
+        )
+
+    @staticmethod
+    def is_ranked(request):
+        # Поиск упорядочен по релевантности, а курсор пересортировал бы
+        # выдачу по дате, поэтому результаты поиска листаются по номерам.
+        return bool(request.query_params.get('search'))
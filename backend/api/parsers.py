@@ -0,0 +1,69 @@
+import json
+
+from django.conf import settings
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from django.utils.datastructures import MultiValueDict
+from rest_framework.exceptions import APIException, ParseError
+from rest_framework.parsers import DataAndFiles, JSONParser, MultiPartParser
+
+
+class RequestTooLarge(APIException):
+    status_code = 413
+    default_detail = 'Размер запроса превышает допустимый'
+    default_code = 'request_too_large'
+
+
+class LimitedTemporaryFileUploadHandler(TemporaryFileUploadHandler):
+    def new_file(self, *args, **kwargs):
+        self.received = 0
+        super().new_file(*args, **kwargs)
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received > settings.IMAGE_MAX_BYTES:
+            self.file.close()
+            raise RequestTooLarge('Размер картинки слишком велик')
+        return super().receive_data_chunk(raw_data, start)
+
+
+class LimitedBodyMixin:
+    def parse(self, stream, media_type=None, parser_context=None):
+        request = parser_context['request']
+        length = request.META.get('CONTENT_LENGTH')
+        if length and int(length) > settings.RECIPE_MAX_BODY_BYTES:
+            raise RequestTooLarge()
+        return super().parse(stream, media_type, parser_context)
+
+
+class LimitedJSONParser(LimitedBodyMixin, JSONParser):
+    pass
+
+
+class RecipeMultiPartParser(LimitedBodyMixin, MultiPartParser):
+    json_fields = ('ingredients', 'tags')
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parsed = super().parse(stream, media_type, parser_context)
+        data = parsed.data.dict()
+        for field in self.json_fields:
+            values = parsed.data.getlist(field)
+            if not values:
+                continue
+            try:
+                data[field] = [
+                    item
+                    for value in values
+                    for item in self.as_list(json.loads(value))
+                ]
+            except ValueError as error:
+                raise ParseError(
+                    f'Поле {field} должно содержать JSON: {error}'
+                )
+        # Request склеивает data.copy() и files через update(): у dict
+        # это превратило бы файл в список, поэтому файлы идут в data.
+        data.update(parsed.files.dict())
+        return DataAndFiles(data, MultiValueDict())
+
+    @staticmethod
+    def as_list(value):
+        return value if isinstance(value, list) else [value]
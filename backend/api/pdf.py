@@ -0,0 +1,214 @@
+import zlib
+from pathlib import Path
+
+from reportlab.pdfbase.ttfonts import SUBSETN, TTFontFace, makeToUnicodeCMap
+
+FONT_PATH = Path(__file__).resolve().parent / 'fonts' / 'DejaVuSans.ttf'
+
+PAGE_WIDTH, PAGE_HEIGHT = 595, 842
+MARGIN = 50
+FONT_SIZE = 11
+LEADING = 16
+LINES_PER_PAGE = (PAGE_HEIGHT - 2 * MARGIN) // LEADING
+SUBSET_SIZE = 256
+
+HEADER = b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n'
+CATALOG, PAGES, RESOURCES = 1, 2, 3
+
+FF_NONSYMBOLIC, FF_SYMBOLIC = 32, 4
+
+
+def real(value):
+    return f'{value:g}'.encode()
+
+
+class Font:
+    """TrueType-шрифт, встраиваемый подмножествами по 256 символов.
+
+    Коды символам назначаются по мере их появления в тексте, поэтому
+    объекты шрифта пишутся в конец документа, когда набор уже известен.
+    """
+
+    def __init__(self, path):
+        self.face = TTFontFace(str(path))
+        self.subsets = [[0]]
+        self.codes = {}
+
+    def code(self, char):
+        if char not in self.face.charToGlyph:
+            return 0, 0
+        if char not in self.codes:
+            if len(self.subsets[-1]) == SUBSET_SIZE:
+                self.subsets.append([0])
+            subset = self.subsets[-1]
+            self.codes[char] = (len(self.subsets) - 1, len(subset))
+            subset.append(char)
+        return self.codes[char]
+
+    def width(self, text):
+        return sum(map(self.face.getCharWidth, map(ord, text))) * (
+            FONT_SIZE / 1000
+        )
+
+    def runs(self, text):
+        """Делит строку на куски из одного подмножества: (номер, коды)."""
+        runs = []
+        for subset, code in map(self.code, map(ord, text)):
+            if runs and runs[-1][0] == subset:
+                runs[-1][1].append(code)
+            else:
+                runs.append((subset, bytearray((code,))))
+        return runs
+
+    def base_name(self, subset):
+        return SUBSETN(subset) + b'+' + self.face.name
+
+
+class PDFWriter:
+    """Пишет PDF по мере чтения строк, не собирая документ в памяти.
+
+    Каждая заполненная страница сразу отдаётся наружу; в памяти остаются
+    только смещения объектов для таблицы xref, номера страниц и
+    назначенные символам коды шрифта.
+    """
+
+    def __init__(self, font_path=FONT_PATH):
+        self.font = Font(font_path)
+        self.position = 0
+        self.offsets = {}
+        self.next_number = RESOURCES + 1
+        self.pages = []
+
+    def render(self, paragraphs):
+        yield self.write(HEADER)
+        yield self.object(
+            CATALOG, b'<< /Type /Catalog /Pages %d 0 R >>' % PAGES
+        )
+        lines = []
+        for paragraph in paragraphs:
+            for line in self.wrap(paragraph):
+                lines.append(line)
+                if len(lines) == LINES_PER_PAGE:
+                    yield self.page(lines)
+                    lines = []
+        if lines or not self.pages:
+            yield self.page(lines)
+        yield self.fonts()
+        yield self.trailer()
+
+    def wrap(self, paragraph):
+        width = PAGE_WIDTH - 2 * MARGIN
+        space = self.font.width(' ')
+        line, line_width = [], 0
+        for word in paragraph.split(' '):
+            word_width = self.font.width(word)
+            if line and line_width + space + word_width > width:
+                yield ' '.join(line)
+                line, line_width = [], 0
+            line_width += word_width + (space if line else 0)
+            line.append(word)
+        yield ' '.join(line)
+
+    def reserve(self):
+        self.next_number += 1
+        return self.next_number - 1
+
+    def write(self, chunk):
+        self.position += len(chunk)
+        return chunk
+
+    def object(self, number, body):
+        self.offsets[number] = self.position
+        return self.write(b'%d 0 obj\n%s\nendobj\n' % (number, body))
+
+    def stream(self, number, content, extra=b''):
+        data = zlib.compress(content)
+        return self.object(
+            number,
+            b'<< /Length %d /Filter /FlateDecode%s >>\nstream\n%s\nendstream'
+            % (len(data), extra, data)
+        )
+
+    def page(self, lines):
+        content = [b'BT']
+        top = PAGE_HEIGHT - MARGIN - FONT_SIZE
+        for position, line in enumerate(lines):
+            content.append(
+                b'1 0 0 1 %d %d Tm' % (MARGIN, top - position * LEADING)
+            )
+            content.extend(
+                b'/F%d %d Tf <%s> Tj'
+                % (subset, FONT_SIZE, codes.hex().encode())
+                for subset, codes in self.font.runs(line)
+            )
+        content.append(b'ET')
+        contents, page = self.reserve(), self.reserve()
+        self.pages.append(page)
+        return self.stream(contents, b'\n'.join(content)) + self.object(
+            page,
+            b'<< /Type /Page /Parent %d 0 R /MediaBox [0 0 %d %d] '
+            b'/Resources %d 0 R /Contents %d 0 R >>'
+            % (PAGES, PAGE_WIDTH, PAGE_HEIGHT, RESOURCES, contents)
+        )
+
+    def fonts(self):
+        face = self.font.face
+        chunks, fonts = [], []
+        for index, subset in enumerate(self.font.subsets):
+            name = self.font.base_name(index)
+            font_file, descriptor, to_unicode, font = (
+                self.reserve() for _ in range(4)
+            )
+            data = face.makeSubset(subset)
+            chunks.append(self.stream(
+                font_file, data, b' /Length1 %d' % len(data)
+            ))
+            chunks.append(self.object(descriptor, b' '.join((
+                b'<< /Type /FontDescriptor /FontName /' + name,
+                b'/Flags %d' % (face.flags & ~FF_NONSYMBOLIC | FF_SYMBOLIC),
+                b'/FontBBox [%s]' % b' '.join(map(real, face.bbox)),
+                b'/ItalicAngle ' + real(face.italicAngle),
+                b'/Ascent ' + real(face.ascent),
+                b'/Descent ' + real(face.descent),
+                b'/CapHeight ' + real(face.capHeight),
+                b'/StemV ' + real(face.stemV),
+                b'/MissingWidth ' + real(face.defaultWidth),
+                b'/FontFile2 %d 0 R >>' % font_file,
+            ))))
+            chunks.append(self.stream(
+                to_unicode,
+                makeToUnicodeCMap(name.decode(), subset).encode()
+            ))
+            chunks.append(self.object(font, b' '.join((
+                b'<< /Type /Font /Subtype /TrueType /BaseFont /' + name,
+                b'/FirstChar 0 /LastChar %d' % (len(subset) - 1),
+                b'/Widths [%s]' % b' '.join(
+                    real(face.getCharWidth(char)) for char in subset
+                ),
+                b'/FontDescriptor %d 0 R' % descriptor,
+                b'/ToUnicode %d 0 R >>' % to_unicode,
+            ))))
+            fonts.append(b'/F%d %d 0 R' % (index, font))
+        chunks.append(self.object(
+            RESOURCES, b'<< /Font << %s >> >>' % b' '.join(fonts)
+        ))
+        kids = b' '.join(b'%d 0 R' % page for page in self.pages)
+        chunks.append(self.object(
+            PAGES,
+            b'<< /Type /Pages /Kids [%s] /Count %d >>'
+            % (kids, len(self.pages))
+        ))
+        return b''.join(chunks)
+
+    def trailer(self):
+        size = self.next_number
+        xref = [b'xref\n0 %d\n0000000000 65535 f \n' % size]
+        xref.extend(
+            b'%010d 00000 n \n' % self.offsets[number]
+            for number in range(1, size)
+        )
+        xref.append(
+            b'trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n'
+            % (size, CATALOG, self.position)
+        )
+        return b''.join(xref)
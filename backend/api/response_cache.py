@@ -0,0 +1,34 @@
+from hashlib import md5
+
+from django.conf import settings
+from django.core.cache import cache
+from recipes import feed_cache
+from rest_framework.response import Response
+
+
+def normalized_query(request):
+    params = sorted(
+        (name, sorted(values))
+        for name, values in request.query_params.lists()
+    )
+    return f'{request.scheme}://{request.get_host()}?{params}'
+
+
+def cached_response(request, generation_keys, prefix, render):
+    if request.user.is_authenticated or not feed_cache.is_shared():
+        return render()
+    versions = feed_cache.generations(*generation_keys)
+    digest = md5(
+        f'{versions}:{normalized_query(request)}'.encode()
+    ).hexdigest()
+    key = f'recipes:response:{prefix}:{digest}'
+    data = cache.get(key)
+    if data is not None:
+        response = Response(data)
+        response['X-Cache'] = 'HIT'
+        return response
+    response = render()
+    if response.status_code == 200:
+        cache.set(key, response.data, settings.RECIPES_CACHE_TIMEOUT)
+    response['X-Cache'] = 'MISS'
+    return response
@@ -1,14 +1,18 @@
 import base64
 
+from django.conf import settings
 from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
 from djoser.serializers import UserCreateSerializer, UserSerializer
+from recipes import shopping_list
+from recipes.images import schedule_recipe_image
 from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
                             ShoppingCart, Tag)
-from rest_framework.serializers import (CharField, ImageField, IntegerField,
-                                        ModelSerializer,
-                                        PrimaryKeyRelatedField,
-                                        SerializerMethodField)
-from rest_framework.validators import UniqueTogetherValidator
+from rest_framework.serializers import (BaseSerializer, CharField, Field,
+                                        ImageField, IntegerField, ListField,
+                                        ModelSerializer, Serializer,
+                                        SerializerMethodField, ValidationError)
 from users.models import Subscription, User
 
 
@@ -30,6 +34,9 @@ class DefaultUserSerializer(UserSerializer):
         )
 
     def get_is_subscribed(self, author):
+        annotated = getattr(author, 'is_subscribed', None)
+        if annotated is not None:
+            return annotated
         user = self.context.get('request').user
         return (
             user.is_authenticated and user.subscriptions.filter(
@@ -69,14 +76,14 @@ class SubscriptionSerializer(DefaultUserSerializer):
         )
 
     def get_recipes_count(self, an_object):
-        return an_object.recipes.count()
+        return an_object.recipes_count
 
     def get_recipes(self, an_object):
         request = self.context.get('request')
-        recipes_limit = request.query_params.get('recipes_limit')
+        recipes_limit = self.context.get('recipes_limit')
         recipes = an_object.recipes.all()
         if recipes_limit:
-            recipes = recipes[:int(recipes_limit)]
+            recipes = recipes[:recipes_limit]
         return RecipeShortSerializer(
             recipes,
             many=True,
@@ -84,18 +91,23 @@ class SubscriptionSerializer(DefaultUserSerializer):
         ).data
 
 
+class RecipesLimitSerializer(Serializer):
+    recipes_limit = IntegerField(min_value=1, required=False)
+
+
+class BulkIdsSerializer(Serializer):
+    ids = ListField(
+        child=IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=settings.BULK_MAX_ITEMS
+    )
+
+
 class SubscribeSerializer(ModelSerializer):
     class Meta:
         model = Subscription
         fields = ('id', 'user', 'author')
 
-        validators = (
-            UniqueTogetherValidator(
-                queryset=Subscription.objects.all(),
-                fields=('user', 'author')
-            ),
-        )
-
 
 class TagsSerializer(ModelSerializer):
 
@@ -116,42 +128,61 @@ class FavoriteSerializer(ModelSerializer):
         model = Favorite
         fields = '__all__'
 
-        validators = (
-            UniqueTogetherValidator(
-                queryset=Favorite.objects.all(),
-                fields=('user', 'recipe'),
-                message='Рецепт был добавлен в избранное'
-            ),
-        )
-
 
 class ShoppingCartSerializer(ModelSerializer):
     class Meta:
         model = ShoppingCart
         fields = '__all__'
 
-        validators = (
-            UniqueTogetherValidator(
-                queryset=ShoppingCart.objects.all(),
-                fields=('user', 'recipe'),
-                message='Рецепт был добавлен в список покупок'
-            ),
-        )
+
+def absolute_url(url, request):
+    if request is None:
+        return url
+    return request.build_absolute_uri(url)
+
+
+def image_variant_urls(variants, request):
+    return {
+        variant: {
+            extension: absolute_url(default_storage.url(path), request)
+            for extension, path in files.items()
+        }
+        for variant, files in variants.items()
+    }
+
+
+class ImageVariantsField(Field):
+    def __init__(self, **kwargs):
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, variants):
+        return image_variant_urls(variants, self.context.get('request'))
 
 
 class RecipeShortSerializer(ModelSerializer):
+    image_variants = ImageVariantsField()
+
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'cooking_time', 'image')
+        fields = ('id', 'name', 'cooking_time', 'image', 'image_variants')
 
 
 class Base64ImageField(ImageField):
     def to_internal_value(self, data):
         if isinstance(data, str) and data.startswith('data:image'):
             format, imgstr = data.split(';base64,')
+            if len(imgstr) * 3 // 4 > settings.IMAGE_MAX_BYTES:
+                raise ValidationError('Размер картинки слишком велик')
             ext = format.split('/')[-1]
             data = ContentFile(base64.b64decode(imgstr), name='temp.' + ext)
-        return super().to_internal_value(data)
+        elif getattr(data, 'size', 0) > settings.IMAGE_MAX_BYTES:
+            raise ValidationError('Размер картинки слишком велик')
+        image = super().to_internal_value(data)
+        width, height = image.image.size
+        if width * height > settings.IMAGE_MAX_PIXELS:
+            raise ValidationError('Разрешение картинки слишком велико')
+        return image
 
 
 class DefaultIngredientAmountSerializer(ModelSerializer):
@@ -181,6 +212,7 @@ class DefaultRecipeSerializer(ModelSerializer):
         method_name='get_is_in_shopping_cart'
     )
     image = Base64ImageField()
+    image_variants = ImageVariantsField()
 
     class Meta:
         model = Recipe
@@ -193,11 +225,21 @@ class DefaultRecipeSerializer(ModelSerializer):
             'is_in_shopping_cart',
             'name',
             'image',
+            'image_variants',
             'text',
             'cooking_time'
         )
 
-    def _is_auth_and_exists_in_model(self, model, an_object):
+    def to_representation(self, an_object):
+        is_subscribed = getattr(an_object, 'author_is_subscribed', None)
+        if is_subscribed is not None:
+            an_object.author.is_subscribed = is_subscribed
+        return super().to_representation(an_object)
+
+    def _is_auth_and_exists_in_model(self, model, an_object, annotation):
+        annotated = getattr(an_object, annotation, None)
+        if annotated is not None:
+            return annotated
         user = self.context.get('request').user
         return user.is_authenticated and model.objects.filter(
             user=user,
@@ -205,10 +247,111 @@ class DefaultRecipeSerializer(ModelSerializer):
         ).exists()
 
     def get_is_favorited(self, an_object):
-        return self._is_auth_and_exists_in_model(Favorite, an_object)
+        return self._is_auth_and_exists_in_model(
+            Favorite,
+            an_object,
+            'is_favorited'
+        )
 
     def get_is_in_shopping_cart(self, an_object):
-        return self._is_auth_and_exists_in_model(ShoppingCart, an_object)
+        return self._is_auth_and_exists_in_model(
+            ShoppingCart,
+            an_object,
+            'is_in_shopping_cart'
+        )
+
+
+class FastRecipeSerializer(BaseSerializer):
+    def _flag(self, recipe, annotation, default):
+        value = getattr(recipe, annotation, None)
+        if value is None:
+            return default()
+        return value
+
+    def to_representation(self, recipe):
+        request = self.context.get('request')
+        author = recipe.author
+        image = None
+        if recipe.image:
+            image = absolute_url(recipe.image.url, request)
+        return {
+            'id': recipe.id,
+            'tags': [
+                {
+                    'id': tag.id,
+                    'name': tag.name,
+                    'color': tag.color,
+                    'slug': tag.slug,
+                }
+                for tag in recipe.tags.all()
+            ],
+            'author': {
+                'email': author.email,
+                'id': author.id,
+                'username': author.username,
+                'first_name': author.first_name,
+                'last_name': author.last_name,
+                'is_subscribed': self._flag(
+                    recipe,
+                    'author_is_subscribed',
+                    lambda: DefaultUserSerializer(
+                        context=self.context
+                    ).get_is_subscribed(author)
+                ),
+            },
+            'ingredients': [
+                {
+                    'id': recipe_ingredient.ingredient.id,
+                    'name': recipe_ingredient.ingredient.name,
+                    'measurement_unit': (
+                        recipe_ingredient.ingredient.measurement_unit
+                    ),
+                    'amount': float(recipe_ingredient.amount),
+                }
+                for recipe_ingredient in recipe.ingredient.all()
+            ],
+            'is_favorited': self._flag(
+                recipe,
+                'is_favorited',
+                lambda: DefaultRecipeSerializer(
+                    context=self.context
+                ).get_is_favorited(recipe)
+            ),
+            'is_in_shopping_cart': self._flag(
+                recipe,
+                'is_in_shopping_cart',
+                lambda: DefaultRecipeSerializer(
+                    context=self.context
+                ).get_is_in_shopping_cart(recipe)
+            ),
+            'name': recipe.name,
+            'image': image,
+            'image_variants': image_variant_urls(
+                recipe.image_variants,
+                request
+            ),
+            'text': recipe.text,
+            'cooking_time': recipe.cooking_time,
+        }
+
+
+class BulkPrimaryKeyRelatedField(ListField):
+    child = IntegerField()
+
+    def __init__(self, queryset, **kwargs):
+        self.queryset = queryset
+        super().__init__(**kwargs)
+
+    def to_internal_value(self, data):
+        ids = list(dict.fromkeys(super().to_internal_value(data)))
+        found = self.queryset.in_bulk(ids)
+        missing = [pk for pk in ids if pk not in found]
+        if missing:
+            raise ValidationError(f'Объекты не найдены: {missing}')
+        return [found[pk] for pk in ids]
+
+    def to_representation(self, value):
+        return [an_object.pk for an_object in value.all()]
 
 
 class IngredientAmountWriteSerializer(ModelSerializer):
@@ -225,7 +368,7 @@ class RecipeWriteSerializer(ModelSerializer):
         many=True,
         source='ingredient'
     )
-    tags = PrimaryKeyRelatedField(many=True, queryset=Tag.objects.all())
+    tags = BulkPrimaryKeyRelatedField(queryset=Tag.objects.all())
     image = Base64ImageField()
 
     class Meta:
@@ -239,20 +382,68 @@ class RecipeWriteSerializer(ModelSerializer):
             'cooking_time'
         )
 
-    def do_ingredients_and_tags(self, recipe, ingredients, tags):
-        RecipeIngredient.objects.bulk_create(
-            [
-                RecipeIngredient(
-                    recipe=recipe,
-                    ingredient=Ingredient.objects.get(
-                        id=ingredient.get('id')
-                    ),
-                    amount=ingredient.get('amount')
-                ) for ingredient in ingredients
-            ]
+    def validate_ingredients(self, ingredients):
+        ids = [ingredient.get('id') for ingredient in ingredients]
+        duplicates = {pk for pk in ids if ids.count(pk) > 1}
+        if duplicates:
+            raise ValidationError(
+                f'Ингредиенты указаны повторно: {sorted(duplicates)}'
+            )
+        found = set(
+            Ingredient.objects.filter(id__in=ids).values_list('id', flat=True)
         )
-        recipe.tags.set(tags)
-
+        missing = [pk for pk in ids if pk not in found]
+        if missing:
+            raise ValidationError(f'Ингредиенты не найдены: {missing}')
+        return ingredients
+
+    def set_ingredients(self, recipe, ingredients):
+        amounts = {
+            ingredient.get('id'): ingredient.get('amount')
+            for ingredient in ingredients
+        }
+        existing = {
+            recipe_ingredient.ingredient_id: recipe_ingredient
+            for recipe_ingredient in RecipeIngredient.objects.filter(
+                recipe=recipe
+            )
+        }
+        deltas = {}
+        removed = existing.keys() - amounts.keys()
+        if removed:
+            RecipeIngredient.objects.filter(
+                recipe=recipe,
+                ingredient_id__in=removed
+            ).delete()
+            for ingredient_id in removed:
+                deltas[ingredient_id] = -existing[ingredient_id].amount
+        changed = []
+        for ingredient_id, recipe_ingredient in existing.items():
+            amount = amounts.get(ingredient_id)
+            if amount is not None and recipe_ingredient.amount != amount:
+                deltas[ingredient_id] = amount - recipe_ingredient.amount
+                recipe_ingredient.amount = amount
+                changed.append(recipe_ingredient)
+        if changed:
+            RecipeIngredient.objects.bulk_update(changed, ('amount',))
+        added = [
+            RecipeIngredient(
+                recipe=recipe,
+                ingredient_id=ingredient_id,
+                amount=amount
+            )
+            for ingredient_id, amount in amounts.items()
+            if ingredient_id not in existing
+        ]
+        if added:
+            RecipeIngredient.objects.bulk_create(added)
+            for recipe_ingredient in added:
+                deltas[recipe_ingredient.ingredient_id] = (
+                    recipe_ingredient.amount
+                )
+        shopping_list.change_recipe_ingredients(recipe.id, deltas)
+
+    @transaction.atomic
     def create(self, input_data):
         ingredients = input_data.pop('ingredient')
         tags = input_data.pop('tags')
@@ -260,16 +451,33 @@ class RecipeWriteSerializer(ModelSerializer):
             author=self.context.get('request').user,
             **input_data
         )
-        self.do_ingredients_and_tags(recipe, ingredients, tags)
+        RecipeIngredient.objects.bulk_create(
+            [
+                RecipeIngredient(
+                    recipe=recipe,
+                    ingredient_id=ingredient.get('id'),
+                    amount=ingredient.get('amount')
+                ) for ingredient in ingredients
+            ]
+        )
+        recipe.tags.add(*tags)
+        schedule_recipe_image(recipe)
         return recipe
 
+    @transaction.atomic
     def update(self, recipe, input_data):
-        ingredients = input_data.pop('ingredient')
-        tags = input_data.pop('tags')
-        recipe.ingredients.clear()
-        recipe.tags.clear()
-        self.do_ingredients_and_tags(recipe, ingredients, tags)
-        return super().update(recipe, input_data)
+        ingredients = input_data.pop('ingredient', None)
+        tags = input_data.pop('tags', None)
+        if ingredients is not None:
+            self.set_ingredients(recipe, ingredients)
+        if tags is not None:
+            recipe.tags.set(tags)
+        if 'image' not in input_data:
+            return super().update(recipe, input_data)
+        recipe.image_variants = {}
+        recipe = super().update(recipe, input_data)
+        schedule_recipe_image(recipe)
+        return recipe
 
     def represent(self, recipe):
         return DefaultRecipeSerializer(
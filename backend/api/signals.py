@@ -0,0 +1,20 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+from users.models import User
+
+from .authentication import token_cache
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_cached_token(instance, **kwargs):
+    key, user_id = instance.key, instance.user_id
+    transaction.on_commit(lambda: token_cache.discard(key))
+    transaction.on_commit(lambda: token_cache.discard_user(user_id))
+
+
+@receiver((post_save, post_delete), sender=User)
+def invalidate_cached_user(instance, **kwargs):
+    user_id = instance.pk
+    transaction.on_commit(lambda: token_cache.discard_user(user_id))
@@ -0,0 +1,1091 @@
+import asyncio
+import json
+import os
+import shutil
+import tempfile
+from io import BytesIO
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+from django.apps import apps
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import F
+from django.test import (AsyncClient, SimpleTestCase, TestCase,
+                         TransactionTestCase, override_settings)
+from django.urls import include, path, resolve
+from django.utils import timezone
+from PIL import Image
+from recipes import images, shopping_list
+from recipes.counters import COUNTERS, count_subquery
+from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
+                            ShoppingCart, ShoppingListItem, Tag)
+from rest_framework.authtoken.models import Token
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+from users.models import Subscription, User
+
+from .async_views import ASYNC_ROUTES, StreamingASGIHandler, async_routes
+from .pdf import LINES_PER_PAGE, PDFWriter
+from .renderers import ORJSONRenderer
+from .serializers import (BulkIdsSerializer, DefaultRecipeSerializer,
+                          FastRecipeSerializer)
+from .urls import router
+from .views import RecipesViewSet
+
+NO_CACHE = {
+    'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}
+}
+SHARED_CACHE = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'test_response_cache',
+    }
+}
+IMAGE = 'recipes/test.png'
+IMAGE_VARIANTS = {
+    'thumbnail': {
+        'webp': 'recipes/variants/test-thumbnail.webp',
+        'jpeg': 'recipes/variants/test-thumbnail.jpeg',
+    },
+}
+
+
+def png(name='upload.png', size=(8, 8)):
+    buffer = BytesIO()
+    Image.frombytes(
+        'RGB', size, os.urandom(size[0] * size[1] * 3)
+    ).save(buffer, 'PNG')
+    return SimpleUploadedFile(name, buffer.getvalue(), 'image/png')
+
+
+def create_user(username, **kwargs):
+    return User.objects.create_user(
+        username=username,
+        email=f'{username}@example.com',
+        password='test-password',
+        first_name=username.capitalize(),
+        last_name='Тестов',
+        **kwargs
+    )
+
+
+class FoodgramTestData:
+    """Общие данные: три автора по 20 рецептов, подписки, избранное."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = create_user('reader')
+        cls.authors = [create_user(f'author{number}') for number in range(3)]
+        cls.tags = [
+            Tag.objects.create(name=name, color=color, slug=slug)
+            for name, color, slug in (
+                ('Завтрак', '#E26C2D', 'breakfast'),
+                ('Обед', '#49B64E', 'lunch'),
+                ('Ужин', '#8775D2', 'dinner'),
+            )
+        ]
+        cls.ingredients = [
+            Ingredient.objects.create(
+                name=f'Ингредиент {number}',
+                measurement_unit='г'
+            )
+            for number in range(5)
+        ]
+        cls.recipes = []
+        for number in range(60):
+            recipe = Recipe.objects.create(
+                author=cls.authors[number % 3],
+                name=f'Рецепт {number}',
+                text='Описание рецепта',
+                cooking_time=10 + number,
+                image=IMAGE,
+                image_variants=IMAGE_VARIANTS
+            )
+            recipe.tags.set(cls.tags[:1 + number % 3])
+            RecipeIngredient.objects.bulk_create(
+                RecipeIngredient(
+                    recipe=recipe,
+                    ingredient=ingredient,
+                    amount=1.5 + position
+                )
+                for position, ingredient in enumerate(
+                    cls.ingredients[:2 + number % 4]
+                )
+            )
+            cls.recipes.append(recipe)
+        for author in cls.authors[:2]:
+            Subscription.objects.create(user=cls.reader, author=author)
+        for recipe in cls.recipes[:10]:
+            Favorite.objects.create(user=cls.reader, recipe=recipe)
+        for recipe in cls.recipes[5:8]:
+            ShoppingCart.objects.create(user=cls.reader, recipe=recipe)
+
+    def setUp(self):
+        self.anonymous = APIClient()
+        self.client = APIClient()
+        self.client.force_authenticate(self.reader)
+
+
+@override_settings(CACHES=NO_CACHE)
+class QueryBudgetTests(FoodgramTestData, TestCase):
+    """Число запросов не зависит от размера страницы: N+1 роняет тест."""
+
+    def assert_queries(self, client, url, expected):
+        with self.assertNumQueries(expected):
+            response = client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_recipe_list(self):
+        for limit in (6, 50):
+            with self.subTest(limit=limit):
+                response = self.assert_queries(
+                    self.anonymous, f'/api/recipes/?limit={limit}', 4
+                )
+                self.assertEqual(len(response.data['results']), limit)
+                self.assert_queries(
+                    self.client, f'/api/recipes/?limit={limit}', 4
+                )
+
+    def test_recipe_detail(self):
+        url = f'/api/recipes/{self.recipes[0].pk}/'
+        self.assert_queries(self.anonymous, url, 5)
+        self.assert_queries(self.client, url, 5)
+
+    def test_user_subscriptions(self):
+        for limit in (1, 2):
+            with self.subTest(limit=limit):
+                self.assert_queries(
+                    self.client,
+                    f'/api/users/subscriptions/?limit={limit}',
+                    3
+                )
+        self.assert_queries(
+            self.client,
+            '/api/users/subscriptions/?recipes_limit=3',
+            3
+        )
+
+    def test_subscription_feed(self):
+        for limit in (6, 50):
+            with self.subTest(limit=limit):
+                self.assert_queries(
+                    self.client,
+                    f'/api/recipes/subscriptions/?limit={limit}',
+                    3
+                )
+
+
+class BulkRelationTests(FoodgramTestData, TestCase):
+    """Пакет связей применяется за фиксированное число запросов."""
+
+    def assert_bulk(self, method, url, ids, expected, queries):
+        with self.assertNumQueries(queries):
+            response = getattr(self.client, method)(
+                url, {'ids': ids}, format='json'
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [
+                (item['id'], item['status'])
+                for item in response.data['results']
+            ],
+            expected
+        )
+
+    def test_favorites(self):
+        old, first, second = (
+            self.recipes[0].pk, self.recipes[20].pk, self.recipes[21].pk
+        )
+        self.assert_bulk(
+            'post', '/api/recipes/favorite/',
+            [old, first, second, first, 999999],
+            [
+                (old, 'exists'),
+                (first, 'created'),
+                (second, 'created'),
+                (999999, 'not_found'),
+            ],
+            7
+        )
+        self.assertEqual(
+            Recipe.objects.get(pk=first).favorites_count, 1
+        )
+        self.assert_bulk(
+            'delete', '/api/recipes/favorite/',
+            [old, first, 999999],
+            [(old, 'deleted'), (first, 'deleted'), (999999, 'not_found')],
+            6
+        )
+        self.assertEqual(
+            list(Favorite.objects.filter(
+                recipe_id__in=(old, first, second)
+            ).values_list('recipe_id', flat=True)),
+            [second]
+        )
+        self.assertEqual(Recipe.objects.get(pk=old).favorites_count, 0)
+
+    def test_query_count_does_not_depend_on_size(self):
+        for recipes in (self.recipes[20:22], self.recipes[30:60]):
+            with self.subTest(size=len(recipes)):
+                self.assert_bulk(
+                    'post', '/api/recipes/favorite/',
+                    [recipe.pk for recipe in recipes],
+                    [(recipe.pk, 'created') for recipe in recipes],
+                    7
+                )
+
+    def test_shopping_cart(self):
+        old, new = self.recipes[5].pk, self.recipes[30].pk
+        self.assert_bulk(
+            'post', '/api/recipes/shopping_cart/',
+            [old, new, 999999],
+            [(old, 'exists'), (new, 'created'), (999999, 'not_found')],
+            12
+        )
+        self.assertEqual(
+            shopping_list.stored_totals(), shopping_list.live_totals()
+        )
+        self.assert_bulk(
+            'delete', '/api/recipes/shopping_cart/',
+            [old, new, 999999],
+            [(old, 'deleted'), (new, 'deleted'), (999999, 'not_found')],
+            11
+        )
+        self.assertEqual(
+            shopping_list.stored_totals(), shopping_list.live_totals()
+        )
+        self.assertEqual(Recipe.objects.get(pk=new).in_carts_count, 0)
+
+    def test_subscriptions(self):
+        old, new = self.authors[0].pk, self.authors[2].pk
+        self.assert_bulk(
+            'post', '/api/users/subscribe/',
+            [old, new, self.reader.pk, 999999],
+            [
+                (old, 'exists'),
+                (new, 'created'),
+                (self.reader.pk, 'self'),
+                (999999, 'not_found'),
+            ],
+            7
+        )
+        self.assertEqual(User.objects.get(pk=new).subscribers_count, 1)
+        self.assert_bulk(
+            'delete', '/api/users/subscribe/',
+            [old, new, 999999],
+            [(old, 'deleted'), (new, 'deleted'), (999999, 'not_found')],
+            6
+        )
+        self.assertFalse(
+            Subscription.objects.filter(author_id__in=(old, new)).exists()
+        )
+
+    def test_invalid_ids(self):
+        for data in (
+            {},
+            {'ids': []},
+            {'ids': [0]},
+            {'ids': ['recipe']},
+            {'ids': list(range(1, settings.BULK_MAX_ITEMS + 2))},
+        ):
+            with self.subTest(data=str(data)[:30]):
+                response = self.client.post(
+                    '/api/recipes/favorite/', data, format='json'
+                )
+                self.assertEqual(response.status_code, 400)
+
+    def test_anonymous(self):
+        for url in (
+            '/api/recipes/favorite/',
+            '/api/recipes/shopping_cart/',
+            '/api/users/subscribe/',
+        ):
+            with self.subTest(url=url):
+                response = self.anonymous.post(
+                    url, {'ids': [self.recipes[0].pk]}, format='json'
+                )
+                self.assertEqual(response.status_code, 401)
+
+
+class ToggleRelationTests(FoodgramTestData, TestCase):
+    """Переключатель связи: один запрос и прежние коды ответов."""
+
+    def assert_toggle(self, method, url, status, queries):
+        with self.assertNumQueries(queries):
+            response = getattr(self.client, method)(url)
+        self.assertEqual(response.status_code, status)
+        return response
+
+    def test_favorite(self):
+        recipe = self.recipes[20]
+        url = f'/api/recipes/{recipe.pk}/favorite/'
+        response = self.assert_toggle('post', url, 201, 1)
+        self.assertEqual(
+            response.data,
+            {
+                'id': Favorite.objects.get(recipe=recipe).pk,
+                'user': self.reader.pk,
+                'recipe': recipe.pk,
+            }
+        )
+        response = self.assert_toggle('post', url, 400, 1)
+        self.assertEqual(
+            response.data['non_field_errors'],
+            ['Рецепт был добавлен в избранное']
+        )
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.favorites_count, 1)
+        self.assert_toggle('delete', url, 204, 1)
+        self.assert_toggle('delete', url, 404, 1)
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.favorites_count, 0)
+        self.assert_toggle('post', '/api/recipes/999999/favorite/', 404, 1)
+
+    def test_shopping_cart(self):
+        recipe = self.recipes[20]
+        url = f'/api/recipes/{recipe.pk}/shopping_cart/'
+        # Ошибка внутри atomic добавляет SAVEPOINT, ROLLBACK TO и RELEASE.
+        self.assert_toggle('post', url, 201, 8)
+        self.assert_toggle('post', url, 400, 4)
+        self.assertEqual(
+            shopping_list.stored_totals(), shopping_list.live_totals()
+        )
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.in_carts_count, 1)
+        self.assert_toggle('delete', url, 204, 8)
+        self.assert_toggle('delete', url, 404, 4)
+        self.assertEqual(
+            shopping_list.stored_totals(), shopping_list.live_totals()
+        )
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.in_carts_count, 0)
+
+    def test_subscribe(self):
+        author = self.authors[2]
+        url = f'/api/users/{author.pk}/subscribe/'
+        response = self.assert_toggle('post', url, 201, 1)
+        self.assertEqual(response.data['author'], author.pk)
+        self.assert_toggle('post', url, 400, 1)
+        author.refresh_from_db()
+        self.assertEqual(author.subscribers_count, 1)
+        self.assert_toggle('delete', url, 204, 1)
+        self.assert_toggle('delete', url, 404, 1)
+        self.assert_toggle('post', '/api/users/999999/subscribe/', 404, 1)
+
+    def test_self_subscribe(self):
+        response = self.assert_toggle(
+            'post', f'/api/users/{self.reader.pk}/subscribe/', 400, 0
+        )
+        self.assertEqual(
+            response.data['non_field_errors'],
+            ['Нельзя подписаться на самого себя']
+        )
+        self.assertFalse(
+            Subscription.objects.filter(author=self.reader).exists()
+        )
+
+    def test_anonymous(self):
+        for url in (
+            f'/api/recipes/{self.recipes[0].pk}/favorite/',
+            f'/api/recipes/{self.recipes[0].pk}/shopping_cart/',
+            f'/api/users/{self.authors[0].pk}/subscribe/',
+        ):
+            for method in ('post', 'delete'):
+                with self.subTest(url=url, method=method):
+                    response = getattr(self.anonymous, method)(url)
+                    self.assertEqual(response.status_code, 401)
+
+
+@override_settings(CACHES=NO_CACHE)
+class ConditionalRequestTests(FoodgramTestData, TestCase):
+    """Совпавший If-None-Match даёт 304, изменение таблицы меняет ETag."""
+
+    def get(self, url, status=200, **headers):
+        response = self.anonymous.get(url, **headers)
+        self.assertEqual(response.status_code, status)
+        return response
+
+    def test_tables(self):
+        for url, queries in (('/api/tags/', 1), ('/api/ingredients/', 1)):
+            with self.subTest(url=url):
+                etag = self.get(url)['ETag']
+                # Версия таблицы читается один раз на ETag и Last-Modified.
+                with self.assertNumQueries(queries):
+                    self.get(url, 304, HTTP_IF_NONE_MATCH=etag)
+
+    def test_table_change_updates_etag(self):
+        url = '/api/ingredients/'
+        etag = self.get(url)['ETag']
+        Ingredient.objects.create(name='Укроп', measurement_unit='г')
+        response = self.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertIn('Укроп', [item['name'] for item in response.data])
+
+    def test_recipe(self):
+        url = f'/api/recipes/{self.recipes[0].pk}/'
+        etag = self.get(url)['ETag']
+        self.get(url, 304, HTTP_IF_NONE_MATCH=etag)
+        Recipe.objects.filter(pk=self.recipes[0].pk).update(
+            name='Новое название', updated_at=timezone.now()
+        )
+        self.assertNotEqual(self.get(url)['ETag'], etag)
+
+
+class IngredientSearchTests(FoodgramTestData, TestCase):
+    """Поиск ингредиентов идёт по индексу в памяти: сначала по началу."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        for name in ('Рисовая мука', 'Мука', 'Мускат'):
+            Ingredient.objects.create(name=name, measurement_unit='г')
+
+    def search(self, name):
+        response = self.anonymous.get(f'/api/ingredients/?name={name}')
+        self.assertEqual(response.status_code, 200)
+        return [ingredient['name'] for ingredient in response.data]
+
+    def test_prefix_matches_first(self):
+        self.assertEqual(self.search('мук'), ['Мука', 'Рисовая мука'])
+        self.assertEqual(
+            self.search('МУ'), ['Мука', 'Мускат', 'Рисовая мука']
+        )
+        self.assertEqual(self.search('ова'), ['Рисовая мука'])
+        self.assertEqual(self.search('нет такого'), [])
+
+    def test_single_query(self):
+        self.search('мук')
+        # Версия каталога читается один раз и для ETag, и для индекса.
+        with self.assertNumQueries(1):
+            self.search('рис')
+
+    def test_catalog_change_rebuilds_index(self):
+        self.assertEqual(self.search('сол'), [])
+        Ingredient.objects.create(name='Соль', measurement_unit='г')
+        self.assertEqual(self.search('сол'), ['Соль'])
+
+
+@override_settings(CACHES=SHARED_CACHE)
+class ResponseCacheTests(FoodgramTestData, TestCase):
+    """Кэш ответов анонимам сбрасывается при создании, правке и удалении."""
+
+    list_url = '/api/recipes/?limit=6'
+
+    @classmethod
+    def setUpTestData(cls):
+        call_command('createcachetable', verbosity=0)
+        super().setUpTestData()
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.authors[0])
+        self.recipe = self.recipes[-3]
+        self.detail_url = f'/api/recipes/{self.recipe.pk}/'
+
+    def get(self, url, cache_status, status=200):
+        response = self.anonymous.get(url)
+        self.assertEqual(response.status_code, status)
+        self.assertEqual(response.get('X-Cache'), cache_status)
+        return response
+
+    def warm_up(self, url):
+        self.get(url, 'MISS')
+        return self.get(url, 'HIT')
+
+    def test_create(self):
+        self.warm_up(self.list_url)
+        with self.captureOnCommitCallbacks(execute=True):
+            Recipe.objects.create(
+                author=self.authors[1],
+                name='Новый рецепт',
+                text='Описание',
+                cooking_time=5,
+                image=IMAGE
+            )
+        response = self.get(self.list_url, 'MISS')
+        self.assertEqual(response.data['count'], 61)
+        self.assertEqual(response.data['results'][0]['name'], 'Новый рецепт')
+
+    def test_update(self):
+        self.warm_up(self.list_url)
+        self.warm_up(self.detail_url)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(
+                self.detail_url, {'name': 'Новое название'}, format='json'
+            )
+        self.assertEqual(response.status_code, 200)
+        response = self.get(self.detail_url, 'MISS')
+        self.assertEqual(response.data['name'], 'Новое название')
+        response = self.get(self.list_url, 'MISS')
+        self.assertIn(
+            'Новое название',
+            [recipe['name'] for recipe in response.data['results']]
+        )
+
+    def test_delete(self):
+        self.warm_up(self.list_url)
+        self.warm_up(self.detail_url)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.delete(self.detail_url)
+        self.assertEqual(response.status_code, 204)
+        self.get(self.detail_url, None, 404)
+        response = self.get(self.list_url, 'MISS')
+        self.assertEqual(response.data['count'], 59)
+
+    @override_settings(CACHES={
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'
+        }
+    })
+    def test_per_process_cache_is_bypassed(self):
+        self.get(self.list_url, None)
+        self.get(self.detail_url, None)
+
+
+class FastRecipeSerializerContractTests(FoodgramTestData, TestCase):
+    """Быстрый сериализатор отдаёт те же байты, что и эталонный."""
+
+    def make_request(self, user):
+        request = Request(APIRequestFactory().get('/api/recipes/'))
+        request.user = user
+        return request
+
+    def assert_same_bytes(self, recipes, request):
+        context = {'request': request}
+        expected = JSONRenderer().render(
+            DefaultRecipeSerializer(recipes, many=True, context=context).data
+        )
+        actual = ORJSONRenderer().render(
+            FastRecipeSerializer(recipes, many=True, context=context).data
+        )
+        self.assertEqual(actual, expected)
+
+    def test_annotated_flags(self):
+        for user in (AnonymousUser(), self.reader):
+            with self.subTest(user=user):
+                recipes = list(
+                    RecipesViewSet.queryset.with_user_flags(user)
+                )
+                if user.is_authenticated:
+                    self.assertTrue(any(
+                        recipe.is_favorited and recipe.author_is_subscribed
+                        for recipe in recipes
+                    ))
+                self.assert_same_bytes(recipes, self.make_request(user))
+
+    def test_fallback_flags(self):
+        for user in (AnonymousUser(), self.reader):
+            with self.subTest(user=user):
+                self.assert_same_bytes(
+                    list(RecipesViewSet.queryset.all()),
+                    self.make_request(user)
+                )
+
+    def test_list_field_errors(self):
+        serializer = BulkIdsSerializer(data={'ids': [1, 0, 'recipe']})
+        self.assertFalse(serializer.is_valid())
+        self.assertEqual(
+            ORJSONRenderer().render(serializer.errors),
+            JSONRenderer().render(serializer.errors)
+        )
+
+
+@override_settings(CACHES=NO_CACHE)
+class RecipeSearchTests(FoodgramTestData, TestCase):
+    """Полнотекстовый поиск на PostgreSQL и его сочетание с фильтрами."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        lunch, dinner = cls.tags[1], cls.tags[2]
+        cls.in_name = Recipe.objects.create(
+            author=cls.authors[0],
+            name='Борщ с пампушками',
+            text='Свекла, капуста и картофель',
+            cooking_time=90,
+            image=IMAGE
+        )
+        cls.in_name.tags.set((lunch,))
+        cls.in_text = Recipe.objects.create(
+            author=cls.authors[1],
+            name='Обед из трёх блюд',
+            text='На первое подаём борщ, на второе котлеты',
+            cooking_time=120,
+            image=IMAGE
+        )
+        cls.in_text.tags.set((lunch, dinner))
+        cls.other_author = Recipe.objects.create(
+            author=cls.authors[2],
+            name='Борщ зелёный',
+            text='Щавель и яйцо',
+            cooking_time=60,
+            image=IMAGE
+        )
+        cls.other_author.tags.set((dinner,))
+        Favorite.objects.create(user=cls.reader, recipe=cls.in_text)
+
+    def search(self, client, query):
+        response = client.get(f'/api/recipes/?search=борщ&{query}')
+        self.assertEqual(response.status_code, 200)
+        return [recipe['id'] for recipe in response.data['results']]
+
+    def test_name_match_ranks_above_text_match(self):
+        ids = self.search(self.anonymous, '')
+        self.assertCountEqual(
+            ids[:2], [self.in_name.pk, self.other_author.pk]
+        )
+        self.assertEqual(ids[2:], [self.in_text.pk])
+
+    def test_search_matches_word_forms(self):
+        response = self.anonymous.get('/api/recipes/?search=борща')
+        self.assertIn(
+            self.in_name.pk,
+            [recipe['id'] for recipe in response.data['results']]
+        )
+
+    def test_search_with_tags(self):
+        self.assertEqual(
+            self.search(self.anonymous, 'tags=dinner'),
+            [self.other_author.pk, self.in_text.pk]
+        )
+
+    def test_search_with_author(self):
+        self.assertEqual(
+            self.search(self.anonymous, f'author={self.authors[2].pk}'),
+            [self.other_author.pk]
+        )
+
+    def test_cursor_mode_keeps_rank(self):
+        ids = self.search(self.anonymous, 'pagination=cursor')
+        self.assertEqual(ids, self.search(self.anonymous, ''))
+        self.assertEqual(ids[2:], [self.in_text.pk])
+
+    def test_subscription_feed_keeps_rank(self):
+        response = self.client.get(
+            '/api/recipes/subscriptions/?search=борщ'
+        )
+        self.assertEqual(response.status_code, 200)
+        # in_text новее, поэтому по дате он шёл бы первым.
+        self.assertEqual(
+            [recipe['id'] for recipe in response.data['results']],
+            [self.in_name.pk, self.in_text.pk]
+        )
+
+    def test_search_with_favorited(self):
+        self.assertEqual(
+            self.search(self.client, 'is_favorited=1'),
+            [self.in_text.pk]
+        )
+
+
+class ShoppingListAggregateTests(FoodgramTestData, TestCase):
+    """Сохранённый список покупок совпадает с подсчётом по корзине."""
+
+    def assert_in_sync(self):
+        self.assertEqual(
+            shopping_list.stored_totals(),
+            shopping_list.live_totals()
+        )
+
+    def test_add(self):
+        ShoppingCart.objects.create(user=self.reader, recipe=self.recipes[11])
+        self.assert_in_sync()
+        self.assertEqual(
+            ShoppingListItem.objects.get(
+                user=self.reader,
+                ingredient=self.ingredients[4]
+            ).amount,
+            11
+        )
+
+    def test_remove(self):
+        ShoppingCart.objects.filter(recipe=self.recipes[5]).delete()
+        ShoppingCart.objects.get(recipe=self.recipes[6]).delete()
+        self.assert_in_sync()
+
+    def test_edit_recipe(self):
+        cart = ShoppingCart.objects.get(recipe=self.recipes[5])
+        cart.recipe = self.recipes[8]
+        cart.save()
+        self.assert_in_sync()
+
+    def test_edit_user(self):
+        cart = ShoppingCart.objects.get(recipe=self.recipes[5])
+        cart.user = self.authors[0]
+        cart.save()
+        self.assert_in_sync()
+        self.assertTrue(
+            ShoppingListItem.objects.filter(user=self.authors[0]).exists()
+        )
+
+    def test_save_without_changes(self):
+        ShoppingCart.objects.get(recipe=self.recipes[5]).save()
+        self.assert_in_sync()
+
+    def test_recipe_cascade_delete(self):
+        self.recipes[5].delete()
+        self.assert_in_sync()
+
+    def test_user_cascade_delete(self):
+        self.reader.delete()
+        self.assertFalse(ShoppingListItem.objects.exists())
+
+
+class CounterTests(FoodgramTestData, TestCase):
+    """Денормализованные счётчики совпадают с COUNT(*) по связям."""
+
+    def assert_counters(self):
+        for model_label, counter, related_label, field in COUNTERS:
+            model = apps.get_model(model_label)
+            drifted = model.objects.annotate(
+                actual=count_subquery(apps.get_model(related_label), field)
+            ).exclude(**{counter: F('actual')})
+            self.assertFalse(drifted.exists(), counter)
+
+    def test_initial(self):
+        self.assert_counters()
+        self.recipes[0].refresh_from_db()
+        self.assertEqual(self.recipes[0].favorites_count, 1)
+
+    def test_add(self):
+        Favorite.objects.create(user=self.authors[0], recipe=self.recipes[0])
+        ShoppingCart.objects.create(user=self.reader, recipe=self.recipes[0])
+        Subscription.objects.create(user=self.reader, author=self.authors[2])
+        Recipe.objects.create(
+            author=self.reader,
+            name='Новый рецепт',
+            text='Описание рецепта',
+            cooking_time=5,
+            image=IMAGE
+        )
+        self.assert_counters()
+
+    def test_remove(self):
+        Favorite.objects.get(recipe=self.recipes[0]).delete()
+        ShoppingCart.objects.filter(recipe=self.recipes[5]).delete()
+        Subscription.objects.filter(author=self.authors[0]).delete()
+        self.recipes[59].delete()
+        self.assert_counters()
+
+    def test_edit(self):
+        favorite = Favorite.objects.get(recipe=self.recipes[0])
+        favorite.recipe = self.recipes[20]
+        favorite.save()
+        cart = ShoppingCart.objects.get(recipe=self.recipes[5])
+        cart.recipe = self.recipes[20]
+        cart.save()
+        subscription = Subscription.objects.get(author=self.authors[0])
+        subscription.author = self.authors[2]
+        subscription.save()
+        self.assert_counters()
+
+    def test_cascade_delete(self):
+        self.authors[0].delete()
+        self.recipes[1].delete()
+        self.assert_counters()
+        self.reader.delete()
+        self.assert_counters()
+
+
+@override_settings(REQUEST_PROFILING=True, CACHES=NO_CACHE)
+class RequestProfilingTests(FoodgramTestData, TestCase):
+    """Server-Timing есть у обычных ответов и пропущен у потоковых."""
+
+    def test_server_timing(self):
+        response = self.client.get('/api/recipes/')
+        self.assertEqual(response.status_code, 200)
+        timing = response['Server-Timing']
+        for name in ('db', 'serialize', 'render', 'total'):
+            self.assertIn(f'{name};dur=', timing)
+        self.assertRegex(timing, r'desc="[1-9]\d* queries')
+
+    def test_streaming_response_is_skipped(self):
+        response = self.client.get('/api/recipes/download_shopping_cart/')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertFalse(response.has_header('Server-Timing'))
+
+
+class ShoppingCartDownloadTests(FoodgramTestData, TestCase):
+    """Список покупок отдаётся потоком в txt, csv и pdf."""
+
+    def download(self, file_format):
+        response = self.client.get(
+            f'/api/recipes/download_shopping_cart/?format={file_format}'
+        )
+        self.assertEqual(response.status_code, 200)
+        return response, b''.join(response.streaming_content)
+
+    def assert_valid_pdf(self, body):
+        self.assertTrue(body.startswith(b'%PDF-1.4\n'))
+        self.assertTrue(body.endswith(b'%%EOF\n'))
+        startxref = int(body.rsplit(b'startxref\n', 1)[1].split()[0])
+        self.assertTrue(body[startxref:].startswith(b'xref\n0 '))
+        lines = body[startxref:].split(b'\n')
+        size = int(lines[1].split()[1])
+        for number, entry in enumerate(lines[3:2 + size], start=1):
+            offset = int(entry.split()[0])
+            self.assertTrue(
+                body[offset:].startswith(b'%d 0 obj\n' % number)
+            )
+
+    def test_formats(self):
+        for file_format, content_type in (
+            ('txt', 'text/plain; charset=utf-8'),
+            ('csv', 'text/csv; charset=utf-8'),
+            ('pdf', 'application/pdf'),
+        ):
+            with self.subTest(file_format=file_format):
+                response, _ = self.download(file_format)
+                self.assertEqual(response['Content-Type'], content_type)
+                self.assertEqual(
+                    response['Content-Disposition'],
+                    f'attachment; filename=reader_ingredients.{file_format}'
+                )
+
+    def test_txt_lists_cart_ingredients(self):
+        _, body = self.download('txt')
+        self.assertIn('Ингредиент 0: ', body.decode())
+
+    def test_pdf(self):
+        _, body = self.download('pdf')
+        self.assert_valid_pdf(body)
+        self.assertIn(b'/BaseFont /AAAAAA+DejaVuSans', body)
+        self.assertIn(b'/Count 1 >>', body)
+
+    def test_pdf_pages_are_streamed(self):
+        lines = (f'Ингредиент {number}' for number in range(100))
+        chunks = list(PDFWriter().render(lines))
+        pages = -(-100 // LINES_PER_PAGE)
+        # Заголовок, каталог, по куску на страницу, шрифты и xref.
+        self.assertEqual(len(chunks), 2 + pages + 2)
+        body = b''.join(chunks)
+        self.assert_valid_pdf(body)
+        self.assertIn(b'/Count %d >>' % pages, body)
+
+
+class RecipeMultipartTests(FoodgramTestData, TestCase):
+    """Рецепт создаётся и меняется формой multipart с файлом картинки."""
+
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        overridden = override_settings(MEDIA_ROOT=media_root)
+        overridden.enable()
+        self.addCleanup(overridden.disable)
+        self.author = self.authors[0]
+        self.client.force_authenticate(self.author)
+
+    def form(self, **fields):
+        return {
+            'name': 'Омлет',
+            'text': 'Взбить яйца',
+            'cooking_time': 5,
+            'tags': json.dumps([self.tags[0].pk]),
+            'ingredients': json.dumps([
+                {'id': self.ingredients[0].pk, 'amount': 3},
+            ]),
+            'image': png(),
+            **fields
+        }
+
+    def test_create(self):
+        response = self.client.post(
+            '/api/recipes/', self.form(), format='multipart'
+        )
+        self.assertEqual(response.status_code, 201, response.data)
+        recipe = Recipe.objects.get(name='Омлет', author=self.author)
+        self.assertTrue(recipe.image.name.endswith('.png'))
+        self.assertEqual(
+            list(recipe.tags.values_list('slug', flat=True)), ['breakfast']
+        )
+        self.assertEqual(
+            list(recipe.ingredient.values_list('ingredient', 'amount')),
+            [(self.ingredients[0].pk, 3)]
+        )
+
+    def test_update(self):
+        recipe = self.recipes[0]
+        response = self.client.patch(
+            f'/api/recipes/{recipe.pk}/',
+            self.form(
+                name='Омлет с сыром',
+                tags=json.dumps([tag.pk for tag in self.tags[1:]])
+            ),
+            format='multipart'
+        )
+        self.assertEqual(response.status_code, 200, response.data)
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.name, 'Омлет с сыром')
+        self.assertNotEqual(recipe.image.name, IMAGE)
+        self.assertCountEqual(
+            recipe.tags.values_list('slug', flat=True), ['lunch', 'dinner']
+        )
+
+    @override_settings(IMAGE_MAX_BYTES=1024)
+    def test_oversized_image(self):
+        response = self.client.post(
+            '/api/recipes/',
+            self.form(image=png(size=(256, 256))),
+            format='multipart'
+        )
+        self.assertEqual(response.status_code, 413)
+        self.assertFalse(Recipe.objects.filter(name='Омлет').exists())
+
+
+class ImageVariantsTests(SimpleTestCase):
+    """Формат без кодировщика не мешает сохранить остальные."""
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        overridden = override_settings(MEDIA_ROOT=media_root)
+        overridden.enable()
+        self.addCleanup(overridden.disable)
+        self.image = default_storage.save('recipes/source.png', png())
+
+    def test_missing_encoder_keeps_other_formats(self):
+        formats = (('webp', 'MISSING'), ('jpeg', 'JPEG'))
+        with mock.patch.object(images, 'FORMATS', formats):
+            with self.assertLogs(images.logger, 'WARNING') as logs:
+                variants = images.render_variants(self.image)
+        for files in variants.values():
+            self.assertEqual(set(files), {'jpeg'})
+            self.assertTrue(default_storage.exists(files['jpeg']))
+        self.assertEqual(len(logs.records), 1)
+        self.assertIn('MISSING', logs.output[0])
+
+
+class AsyncUrls:
+    urlpatterns = [path('api/', include(async_routes(router.urls)))]
+
+
+@override_settings(CACHES=NO_CACHE, ROOT_URLCONF=AsyncUrls)
+class AsyncRoutesTests(TransactionTestCase):
+    """Маршруты режима ASGI сохраняют настройки @action и потоковую отдачу.
+
+    Представления выполняются в пуле потоков со своими соединениями,
+    поэтому данные должны быть закоммичены, а соединения закрываться
+    после каждого запроса.
+    """
+
+    def setUp(self):
+        settings_dict = connection.settings_dict
+        self.addCleanup(
+            settings_dict.__setitem__,
+            'CONN_MAX_AGE',
+            settings_dict['CONN_MAX_AGE']
+        )
+        settings_dict['CONN_MAX_AGE'] = 0
+        self.user = create_user('reader')
+        self.token = Token.objects.create(user=self.user)
+        self.tag = Tag.objects.create(
+            name='Обед', color='#49B64E', slug='lunch'
+        )
+        self.ingredient = Ingredient.objects.create(
+            name='Картофель', measurement_unit='г'
+        )
+        self.recipe = Recipe.objects.create(
+            author=self.user,
+            name='Пюре',
+            text='Сварить и размять',
+            cooking_time=30,
+            image=IMAGE
+        )
+        self.recipe.tags.set((self.tag,))
+        RecipeIngredient.objects.create(
+            recipe=self.recipe, ingredient=self.ingredient, amount=500
+        )
+        ShoppingCart.objects.create(user=self.user, recipe=self.recipe)
+        self.client = AsyncClient()
+
+    async def get(self, url, status=200, **headers):
+        # AsyncClient в Django 3.2 передаёт именованные аргументы
+        # как заголовки ASGI, а не как ключи META.
+        response = await self.client.get(url, **headers)
+        self.assertEqual(response.status_code, status)
+        return response
+
+    async def download(self, query=''):
+        response = await self.get(
+            f'/api/recipes/download_shopping_cart/{query}',
+            authorization=f'Token {self.token.key}'
+        )
+        self.assertTrue(response.streaming)
+        body = await sync_to_async(b''.join)(response.streaming_content)
+        return response, body
+
+    def test_routes_are_async(self):
+        for url in (
+            '/api/recipes/',
+            f'/api/recipes/{self.recipe.pk}/',
+            '/api/recipes/download_shopping_cart/',
+            '/api/tags/',
+            '/api/ingredients/',
+        ):
+            with self.subTest(url=url):
+                match = resolve(url)
+                self.assertIn(match.url_name, ASYNC_ROUTES)
+                self.assertTrue(asyncio.iscoroutinefunction(match.func))
+
+    async def test_recipes(self):
+        response = await self.get('/api/recipes/')
+        self.assertEqual(response.json()['count'], 1)
+        response = await self.get(f'/api/recipes/{self.recipe.pk}/')
+        self.assertEqual(response.json()['name'], 'Пюре')
+        await self.get('/api/recipes/0/', 404)
+
+    async def test_tags_and_ingredients(self):
+        response = await self.get('/api/tags/')
+        self.assertEqual(response.json()[0]['slug'], 'lunch')
+        response = await self.get('/api/ingredients/?name=кар')
+        self.assertEqual(response.json()[0]['name'], 'Картофель')
+
+    async def test_download_shopping_cart(self):
+        await self.get('/api/recipes/download_shopping_cart/', 401)
+        response, body = await self.download()
+        self.assertEqual(
+            response['Content-Type'], 'text/plain; charset=utf-8'
+        )
+        self.assertIn('Картофель: 500.0, г', body.decode())
+        response, body = await self.download('?format=csv')
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        response, body = await self.download('?format=pdf')
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertTrue(body.startswith(b'%PDF-'))
+
+    async def test_handler_streams_download(self):
+        messages = []
+
+        async def receive():
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+        async def send(message):
+            messages.append(message)
+
+        await StreamingASGIHandler()({
+            'type': 'http',
+            'method': 'GET',
+            'path': '/api/recipes/download_shopping_cart/',
+            'query_string': b'format=pdf',
+            'headers': [
+                (b'authorization', f'Token {self.token.key}'.encode()),
+            ],
+            'server': ('testserver', 80),
+        }, receive, send)
+        start, *parts, end = messages
+        self.assertEqual(start['status'], 200)
+        self.assertGreater(len(parts), 1)
+        self.assertTrue(all(part['more_body'] for part in parts))
+        self.assertFalse(end.get('more_body', False))
+        body = b''.join(part['body'] for part in parts)
+        self.assertTrue(body.startswith(b'%PDF-'))
+        self.assertTrue(body.endswith(b'%%EOF\n'))
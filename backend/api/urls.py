@@ -1,6 +1,8 @@
+from django.conf import settings
 from django.urls import include, path
 from rest_framework import routers
 
+from .async_views import async_routes
 from .views import (IngredientsViewSet, RecipesViewSet, TagsViewSet,
                     UsersViewSet)
 
@@ -12,7 +14,12 @@ router.register('ingredients', IngredientsViewSet, basename='ingredients')
 
 
 urlpatterns = [
-    path('', include(router.urls)),
+    path(
+        '',
+        include(
+            async_routes(router.urls) if settings.ASGI_MODE else router.urls
+        )
+    ),
     path('', include('djoser.urls')),
     path('auth/', include('djoser.urls.authtoken')),
 ]
@@ -1,29 +1,84 @@
-from django.db.models import Sum
-from django.http.response import HttpResponse
-from django.shortcuts import get_object_or_404
+from functools import partial
+
+from django.db import transaction
+from django.db.models import F, OuterRef, Prefetch, Subquery, Value
+from django.http.response import StreamingHttpResponse
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser.views import UserViewSet
-from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
-                            ShoppingCart, Tag)
+from recipes import feed_cache, relations
+from recipes.ingredient_index import ingredient_index
+from recipes.models import (Ingredient, Recipe, RecipeIngredient,
+                            ShoppingListItem, Tag)
 from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound, ValidationError
 from rest_framework.permissions import (SAFE_METHODS, AllowAny,
                                         IsAuthenticated,
                                         IsAuthenticatedOrReadOnly)
+from rest_framework.renderers import BrowsableAPIRenderer
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
 from rest_framework.status import HTTP_201_CREATED, HTTP_204_NO_CONTENT
 from rest_framework.viewsets import ModelViewSet
 from users.models import Subscription, User
 
+from .conditional import (INGREDIENTS, TAGS, recipe_etag, recipe_last_modified,
+                          table_etag, table_last_modified, table_stamp)
 from .custom_functions import generate_attachment
 from .filters import IngredienFilter, RecipeFilter
+from .pagination import FoodgramCursorPagination, FoodgramPagination
+from .parsers import LimitedJSONParser, RecipeMultiPartParser
 from .permissions import IsAuthorOrReadOnly
-from .serializers import (DefaultRecipeSerializer, DefaultUserSerializer,
-                          FavoriteSerializer, IngredientsSerializer,
+from .renderers import (CSVRenderer, ORJSONRenderer, PDFRenderer,
+                        PlainTextRenderer)
+from .response_cache import cached_response
+from .serializers import (BulkIdsSerializer, DefaultUserSerializer,
+                          FastRecipeSerializer, FavoriteSerializer,
+                          IngredientsSerializer, RecipesLimitSerializer,
                           RecipeWriteSerializer, ShoppingCartSerializer,
                           SubscribeSerializer, SubscriptionSerializer,
                           TagsSerializer)
 
 
+def bulk_response(request, relation):
+    serializer = BulkIdsSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    apply = relations.add if request.method == 'POST' else relations.remove
+    results = apply(relation, request.user, serializer.validated_data['ids'])
+    return Response({
+        'results': [{'id': pk, 'status': status} for pk, status in results]
+    })
+
+
+def toggle_response(request, relation, serializer_class, pk):
+    try:
+        pk = int(pk)
+    except ValueError:
+        raise NotFound()
+    user = request.user
+    if request.method == 'POST':
+        status, created_id = relations.add_one(relation, user, pk)
+        if status == relations.NOT_FOUND:
+            raise NotFound()
+        if status != relations.CREATED:
+            raise ValidationError({
+                api_settings.NON_FIELD_ERRORS_KEY: [relation.messages[status]]
+            })
+        instance = relation.model(
+            pk=created_id,
+            user=user,
+            **{relation.column: pk}
+        )
+        return Response(
+            serializer_class(instance).data,
+            status=HTTP_201_CREATED
+        )
+    if relations.remove_one(relation, user, pk) == relations.NOT_FOUND:
+        raise NotFound()
+    return Response(status=HTTP_204_NO_CONTENT)
+
+
 class UsersViewSet(UserViewSet):
     queryset = User.objects.all()
     serializer_class = DefaultUserSerializer
@@ -35,11 +90,29 @@ class UsersViewSet(UserViewSet):
         permission_classes=(IsAuthenticatedOrReadOnly,)
     )
     def subscriptions(self, request):
-        queryset = User.objects.filter(subscribers__user=request.user)
+        params = RecipesLimitSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        recipes_limit = params.validated_data.get('recipes_limit')
+        recipes = Recipe.objects.all()
+        if recipes_limit:
+            recipes = recipes.filter(
+                pk__in=Subquery(
+                    Recipe.objects.filter(
+                        author=OuterRef('author')
+                    ).values('pk')[:recipes_limit]
+                )
+            )
+        queryset = User.objects.filter(
+            subscribers__user=request.user
+        ).annotate(
+            is_subscribed=Value(True)
+        ).prefetch_related(
+            Prefetch('recipes', queryset=recipes)
+        )
         page = self.paginate_queryset(queryset)
         serializer_data = SubscriptionSerializer(
             page,
-            context={'request': request},
+            context={'request': request, 'recipes_limit': recipes_limit},
             many=True
         ).data
         return self.get_paginated_response(serializer_data)
@@ -50,80 +123,141 @@ class UsersViewSet(UserViewSet):
         permission_classes=(IsAuthenticated,)
     )
     def subscribe(self, request, id):
-        user = request.user
-        author = get_object_or_404(User, id=id)
-        if request.method == 'POST':
-            serializer_data = {'user': user.id, 'author': author.id}
-            serializer = SubscribeSerializer(
-                data=serializer_data,
-                context={'request': request}
-            )
-            serializer.is_valid(raise_exception=True)
-            serializer.save()
-            return Response(serializer.data, status=HTTP_201_CREATED)
-        model_object = get_object_or_404(
-            Subscription,
-            user=user,
-            author=author
+        return toggle_response(
+            request, relations.SUBSCRIPTIONS, SubscribeSerializer, id
         )
-        model_object.delete()
-        return Response(status=HTTP_204_NO_CONTENT)
+
+    @action(
+        detail=False,
+        methods=['POST', 'DELETE'],
+        url_path='subscribe',
+        url_name='subscribe-bulk',
+        permission_classes=(IsAuthenticated,)
+    )
+    def subscribe_bulk(self, request):
+        return bulk_response(request, relations.SUBSCRIPTIONS)
 
 
+@method_decorator(
+    condition(etag_func=recipe_etag, last_modified_func=recipe_last_modified),
+    name='retrieve'
+)
 class RecipesViewSet(ModelViewSet):
-    queryset = Recipe.objects.all()
+    queryset = Recipe.objects.select_related('author').prefetch_related(
+        'tags',
+        Prefetch(
+            'ingredient',
+            queryset=RecipeIngredient.objects.select_related('ingredient')
+        )
+    )
     permission_classes = (IsAuthenticatedOrReadOnly, IsAuthorOrReadOnly)
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
+    parser_classes = (LimitedJSONParser, RecipeMultiPartParser)
+    renderer_classes = (ORJSONRenderer, BrowsableAPIRenderer)
     http_method_names = ('get', 'post', 'patch', 'delete')
 
+    @property
+    def paginator(self):
+        if not hasattr(self, '_paginator'):
+            if FoodgramCursorPagination.is_ranked(self.request):
+                self._paginator = FoodgramPagination()
+            elif FoodgramCursorPagination.is_requested(self.request):
+                self._paginator = FoodgramCursorPagination()
+        return super().paginator
+
+    def get_queryset(self):
+        return self.queryset.with_user_flags(self.request.user)
+
+    def list(self, request, *args, **kwargs):
+        return cached_response(
+            request,
+            (feed_cache.FEED,),
+            'list',
+            partial(super().list, request, *args, **kwargs)
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        pk = kwargs.get('pk')
+        return cached_response(
+            request,
+            (feed_cache.CATALOG, feed_cache.recipe_key(pk)),
+            f'detail:{pk}',
+            partial(super().retrieve, request, *args, **kwargs)
+        )
+
     def get_serializer_class(self):
         if self.request.method in SAFE_METHODS:
-            return DefaultRecipeSerializer
+            return FastRecipeSerializer
         return RecipeWriteSerializer
 
+    @action(
+        detail=False,
+        methods=['GET'],
+        permission_classes=(IsAuthenticated,),
+        pagination_class=FoodgramCursorPagination
+    )
+    def subscriptions(self, request):
+        queryset = self.filter_queryset(
+            self.get_queryset().filter(
+                author__in=Subscription.objects.filter(
+                    user=request.user
+                ).values('author')
+            )
+        )
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
     @action(
         detail=True,
         methods=['POST', 'DELETE'],
         url_path='shopping_cart',
         permission_classes=(IsAuthenticated,)
     )
+    @transaction.atomic
     def shopping_cart(self, request, pk):
-        user = request.user
-        recipe = get_object_or_404(Recipe, id=pk)
-        if request.method == 'POST':
-            serialized_data = {'user': user.id, 'recipe': recipe.pk}
-            serializer = ShoppingCartSerializer(
-                data=serialized_data,
-                context={'request': request}
-            )
-            serializer.is_valid(raise_exception=True)
-            serializer.save()
-            return Response(serializer.data, status=HTTP_201_CREATED)
-        model_object = get_object_or_404(
-            ShoppingCart,
-            user=user,
-            recipe=recipe
+        return toggle_response(
+            request, relations.SHOPPING_CART, ShoppingCartSerializer, pk
         )
-        model_object.delete()
-        return Response(status=HTTP_204_NO_CONTENT)
 
     @action(
         detail=False,
-        methods=['GET'],
+        methods=['POST', 'DELETE'],
+        url_path='shopping_cart',
+        url_name='shopping-cart-bulk',
         permission_classes=(IsAuthenticated,)
     )
+    def shopping_cart_bulk(self, request):
+        return bulk_response(request, relations.SHOPPING_CART)
+
+    @action(
+        detail=False,
+        methods=['GET'],
+        permission_classes=(IsAuthenticated,),
+        renderer_classes=(PlainTextRenderer, CSVRenderer, PDFRenderer)
+    )
     def download_shopping_cart(self, request):
         user = request.user
         recipe = Recipe.objects.filter(in_shopping_cart__user=user)
-        ingredients = RecipeIngredient.objects.filter(
-            recipe__in=recipe
+        ingredients = ShoppingListItem.objects.filter(
+            user=user
         ).values(
-            'ingredient__name', 'ingredient__measurement_unit'
-        ).annotate(ingredient_amount=Sum('amount'))
-        attachment = generate_attachment(user.username, recipe, ingredients)
+            'ingredient__name',
+            'ingredient__measurement_unit',
+            ingredient_amount=F('amount')
+        ).order_by('ingredient__name')
+        attachment = generate_attachment(
+            user.username,
+            recipe.values_list('name', flat=True).iterator(),
+            ingredients.iterator(),
+            request.accepted_renderer.format
+        )
 
-        response = HttpResponse(attachment.body, content_type='text/plain')
+        response = StreamingHttpResponse(
+            attachment.body,
+            content_type=attachment.content_type
+        )
         response['Content-Disposition'] = (
             f'attachment; filename={attachment.name}'
         )
@@ -135,22 +269,28 @@ class RecipesViewSet(ModelViewSet):
         permission_classes=(IsAuthenticated,)
     )
     def favorite(self, request, pk):
-        user = request.user
-        recipe = get_object_or_404(Recipe, id=pk)
-        if request.method == 'POST':
-            serialized_data = {'user': user.id, 'recipe': recipe.id}
-            serializer = FavoriteSerializer(
-                data=serialized_data,
-                context={'request': request}
-            )
-            serializer.is_valid(raise_exception=True)
-            serializer.save()
-            return Response(serializer.data, status=HTTP_201_CREATED)
-        model_object = get_object_or_404(Favorite, user=user, recipe=recipe)
-        model_object.delete()
-        return Response(status=HTTP_204_NO_CONTENT)
+        return toggle_response(
+            request, relations.FAVORITES, FavoriteSerializer, pk
+        )
+
+    @action(
+        detail=False,
+        methods=['POST', 'DELETE'],
+        url_path='favorite',
+        url_name='favorite-bulk',
+        permission_classes=(IsAuthenticated,)
+    )
+    def favorite_bulk(self, request):
+        return bulk_response(request, relations.FAVORITES)
 
 
+@method_decorator(
+    condition(
+        etag_func=table_etag(TAGS),
+        last_modified_func=table_last_modified(TAGS)
+    ),
+    name='list'
+)
 class TagsViewSet(ModelViewSet):
     queryset = Tag.objects.all()
     serializer_class = TagsSerializer
@@ -158,6 +298,13 @@ class TagsViewSet(ModelViewSet):
     pagination_class = None
 
 
+@method_decorator(
+    condition(
+        etag_func=table_etag(INGREDIENTS),
+        last_modified_func=table_last_modified(INGREDIENTS)
+    ),
+    name='list'
+)
 class IngredientsViewSet(ModelViewSet):
     queryset = Ingredient.objects.all()
     serializer_class = IngredientsSerializer
@@ -165,3 +312,10 @@ class IngredientsViewSet(ModelViewSet):
     filter_backends = (DjangoFilterBackend,)
     filterset_class = IngredienFilter
     pagination_class = None
+
+    def list(self, request, *args, **kwargs):
+        name = request.query_params.get('name')
+        if name is None:
+            return super().list(request, *args, **kwargs)
+        version, _ = table_stamp(request, INGREDIENTS)
+        return Response(ingredient_index.search(name, version))
@@ -1,7 +1,10 @@
 import os
 
-from django.core.asgi import get_asgi_application
+import django
+from api.async_views import StreamingASGIHandler
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+os.environ.setdefault('ASGI_MODE', 'True')
 
-application = get_asgi_application()
+django.setup(set_prefix=False)
+application = StreamingASGIHandler()
@@ -0,0 +1,40 @@
+from django.db.backends.postgresql import base
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """PostgreSQL с CONN_HEALTH_CHECKS из Django 4.1.
+
+    Переиспользуемое соединение проверяется один раз за запрос и только
+    перед первым обращением к базе; запросы без SQL проверку не платят.
+    """
+
+    health_check_done = False
+
+    def connect(self):
+        # connect() сам вызывает set_autocommit: свежее соединение
+        # проверять незачем, а SELECT 1 открыл бы транзакцию.
+        self.health_check_done = True
+        super().connect()
+
+    def close_if_unusable_or_obsolete(self):
+        super().close_if_unusable_or_obsolete()
+        self.health_check_done = False
+
+    def close_if_health_check_failed(self):
+        if (
+            self.connection is None
+            or not self.settings_dict.get('CONN_HEALTH_CHECKS')
+            or self.health_check_done
+        ):
+            return
+        if not self.is_usable():
+            self.close()
+        self.health_check_done = True
+
+    def set_autocommit(self, *args, **kwargs):
+        self.close_if_health_check_failed()
+        return super().set_autocommit(*args, **kwargs)
+
+    def _cursor(self, name=None):
+        self.close_if_health_check_failed()
+        return super()._cursor(name)
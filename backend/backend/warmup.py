@@ -0,0 +1,32 @@
+import logging
+
+from django.core.cache import close_caches
+from django.db import DatabaseError, connections
+from django.urls import reverse
+from PIL import Image
+from recipes.ingredient_index import ingredient_index
+
+logger = logging.getLogger(__name__)
+
+
+def warm_up():
+    """Прогревает мастер gunicorn до форка воркеров (preload_app).
+
+    Импортирует маршруты и представления, строит индекс ингредиентов и
+    регистрирует плагины Pillow: воркеры получают всё это готовым. Если
+    база ещё недоступна или не мигрирована, индекс строится лениво при
+    первом поиске. Сокеты БД и кэша закрываются, чтобы воркеры не делили
+    соединения мастера.
+    """
+    reverse('recipes-list')
+    Image.init()
+    try:
+        ingredient_index.build()
+    except DatabaseError:
+        logger.warning(
+            'База недоступна, индекс ингредиентов будет построен позже',
+            exc_info=True
+        )
+    finally:
+        connections.close_all()
+        close_caches()
@@ -1,6 +1,7 @@
 from django.conf import settings
 from django.contrib import admin
 
+from .images import schedule_recipe_image
 from .models import Favorite, Ingredient, Recipe, ShoppingCart, Tag
 
 admin.site.empty_value_display = settings.DEFAULT_ADMIN_EMPTY_VALUE
@@ -29,11 +30,27 @@ class RecipesAdmin(admin.ModelAdmin):
         'image',
         'text',
         'cooking_time',
-        'publication_date'
+        'publication_date',
+        'favorites_count',
+        'in_carts_count'
     )
     list_filter = ('author', 'name', 'tags')
     search_fields = ('author', 'name', 'tags')
 
+    def get_readonly_fields(self, request, recipe=None):
+        # recipes_count автора меняется только при создании и удалении
+        # рецепта, поэтому автора существующего рецепта не переназначить.
+        if recipe is not None:
+            return ('author',)
+        return ()
+
+    def save_model(self, request, recipe, form, change):
+        if 'image' in form.changed_data:
+            recipe.image_variants = {}
+        super().save_model(request, recipe, form, change)
+        if 'image' in form.changed_data:
+            schedule_recipe_image(recipe)
+
 
 @admin.register(ShoppingCart)
 class ShoppingCartAdmin(admin.ModelAdmin):
@@ -0,0 +1,50 @@
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+COUNTERS = (
+    ('recipes.Recipe', 'favorites_count', 'recipes.Favorite', 'recipe'),
+    ('recipes.Recipe', 'in_carts_count', 'recipes.ShoppingCart', 'recipe'),
+    ('users.User', 'recipes_count', 'recipes.Recipe', 'author'),
+    ('users.User', 'subscribers_count', 'users.Subscription', 'author'),
+)
+
+
+def change_counter(model, pk, field, delta):
+    model.objects.filter(pk=pk).update(**{field: F(field) + delta})
+
+
+def change_counters(model, pks, field, delta):
+    if pks:
+        model.objects.filter(pk__in=pks).update(**{field: F(field) + delta})
+
+
+def move_counter(model, field, old_pk, new_pk):
+    if old_pk != new_pk:
+        change_counter(model, old_pk, field, -1)
+        change_counter(model, new_pk, field, 1)
+
+
+def count_subquery(related_model, field):
+    return Coalesce(
+        Subquery(
+            related_model.objects.filter(
+                **{field: OuterRef('pk')}
+            ).order_by().values(field).annotate(
+                total=Count('pk')
+            ).values('total')
+        ),
+        0
+    )
+
+
+def recount(apps, batch_size=1000):
+    for model_label, counter, related_label, field in COUNTERS:
+        model = apps.get_model(model_label)
+        related_model = apps.get_model(related_label)
+        pks = list(
+            model.objects.order_by('pk').values_list('pk', flat=True)
+        )
+        for start in range(0, len(pks), batch_size):
+            model.objects.filter(
+                pk__in=pks[start:start + batch_size]
+            ).update(**{counter: count_subquery(related_model, field)})
@@ -0,0 +1,54 @@
+from time import time_ns
+
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+
+FEED = 'recipes:generation:feed'
+CATALOG = 'recipes:generation:catalog'
+
+# Поколения и всё, что от них зависит, должны быть видны всем воркерам,
+# иначе запись сбросит кэш только в обработавшем её процессе.
+PER_PROCESS_CACHES = (LocMemCache, DummyCache)
+
+
+def is_shared():
+    return not isinstance(caches[DEFAULT_CACHE_ALIAS], PER_PROCESS_CACHES)
+
+
+def recipe_key(pk):
+    return f'recipes:generation:recipe:{pk}'
+
+
+def generations(*keys):
+    found = cache.get_many(keys)
+    for key in keys:
+        if key not in found:
+            cache.add(key, time_ns(), timeout=None)
+            found[key] = cache.get(key)
+    return tuple(found[key] for key in keys)
+
+
+def _bump(*keys):
+    for key in keys:
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, time_ns(), timeout=None)
+
+
+def bump(*keys):
+    transaction.on_commit(lambda: _bump(*keys))
+
+
+def recipe_changed(pk):
+    bump(FEED, recipe_key(pk))
+
+
+def recipes_changed(pks):
+    bump(FEED, *map(recipe_key, pks))
+
+
+def catalog_changed():
+    bump(FEED, CATALOG)
@@ -0,0 +1,89 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from pathlib import PurePosixPath
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connections, transaction
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from . import feed_cache
+from .models import Recipe
+
+logger = logging.getLogger(__name__)
+
+VARIANTS_DIR = 'recipes/variants'
+FORMATS = (('webp', 'WEBP'), ('jpeg', 'JPEG'))
+
+_executor = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.IMAGE_WORKERS,
+            thread_name_prefix='recipe-images'
+        )
+    return _executor
+
+
+def render_variants(image_name):
+    stem = PurePosixPath(image_name).stem
+    variants = {}
+    with default_storage.open(image_name) as source:
+        with Image.open(source) as original:
+            image = ImageOps.exif_transpose(original).convert('RGB')
+    skipped = set()
+    for variant, size in settings.IMAGE_VARIANTS.items():
+        resized = image.copy()
+        resized.thumbnail((size, size))
+        for extension, image_format in FORMATS:
+            if image_format in skipped:
+                continue
+            buffer = BytesIO()
+            # Pillow без кодировщика (например, WEBP) бросает KeyError
+            # или OSError: формат пропускается, остальные сохраняются.
+            try:
+                resized.save(buffer, image_format, quality=80)
+            except (KeyError, OSError):
+                logger.warning(
+                    'Формат %s пропущен для картинки %s',
+                    image_format, image_name, exc_info=True
+                )
+                skipped.add(image_format)
+                continue
+            variants.setdefault(variant, {})[extension] = (
+                default_storage.save(
+                    f'{VARIANTS_DIR}/{stem}_{variant}.{extension}',
+                    ContentFile(buffer.getvalue())
+                )
+            )
+    return variants
+
+
+def process_recipe_image(recipe_id, image_name):
+    try:
+        Recipe.objects.filter(pk=recipe_id, image=image_name).update(
+            image_variants=render_variants(image_name),
+            updated_at=timezone.now()
+        )
+        feed_cache.recipe_changed(recipe_id)
+    except Exception:
+        logger.exception('Не удалось обработать картинку %s', image_name)
+    finally:
+        connections.close_all()
+
+
+def schedule_recipe_image(recipe):
+    recipe_id, image_name = recipe.pk, recipe.image.name
+    transaction.on_commit(
+        lambda: get_executor().submit(
+            process_recipe_image,
+            recipe_id,
+            image_name
+        )
+    )
@@ -0,0 +1,88 @@
+from bisect import bisect_left, bisect_right
+from collections import namedtuple
+from threading import Lock
+
+from .models import Ingredient, TableVersion
+
+FIELDS = ('id', 'name', 'measurement_unit')
+SEPARATOR = '\n'
+
+Snapshot = namedtuple(
+    'Snapshot', ('version', 'keys', 'rows', 'text', 'starts')
+)
+
+
+def current_version():
+    version, _ = TableVersion.stamps(TableVersion.INGREDIENTS).get(
+        TableVersion.INGREDIENTS, (0, None)
+    )
+    return version
+
+
+class IngredientIndex:
+    """Отсортированный каталог ингредиентов в памяти процесса.
+
+    Версия берётся из TableVersion, которую сигналы и load_ingredients
+    повышают при каждом изменении каталога, поэтому любой воркер, в том
+    числе унаследовавший снимок мастера, перестраивает индекс на следующем
+    поиске. Представление передаёт версию, уже прочитанную для ETag, и
+    поиск обходится без запросов к БД. Снимок заменяется целиком и никогда
+    не обнуляется.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._snapshot = None
+
+    def _build(self, version):
+        rows = sorted(
+            Ingredient.objects.values(*FIELDS),
+            key=lambda row: (row['name'].lower(), row['id'])
+        )
+        keys = [row['name'].lower() for row in rows]
+        starts, position = [], 0
+        for key in keys:
+            starts.append(position)
+            position += len(key) + len(SEPARATOR)
+        self._snapshot = Snapshot(
+            version, keys, rows, SEPARATOR.join(keys), starts
+        )
+        return self._snapshot
+
+    def build(self):
+        with self._lock:
+            return self._build(current_version())
+
+    def _fresh_snapshot(self, version):
+        snapshot = self._snapshot
+        if snapshot is None or snapshot.version != version:
+            with self._lock:
+                snapshot = self._snapshot
+                if snapshot is None or snapshot.version != version:
+                    snapshot = self._build(version)
+        return snapshot
+
+    def search(self, name, version=None):
+        if version is None:
+            version = current_version()
+        _, keys, rows, text, starts = self._fresh_snapshot(version)
+        query = name.lower()
+        start = bisect_left(keys, query)
+        end = bisect_left(keys, query + chr(0x10FFFF), start)
+        if not query or SEPARATOR in query:
+            return rows[start:end]
+        # Вхождения ищутся str.find по склеенным ключам, а не циклом по
+        # строкам: после совпадения поиск продолжается со следующего ключа.
+        contains = []
+        offset = text.find(query)
+        while offset != -1:
+            position = bisect_right(starts, offset) - 1
+            if not start <= position < end:
+                contains.append(rows[position])
+            if position + 1 == len(starts):
+                break
+            offset = text.find(query, starts[position + 1])
+        return rows[start:end] + contains
+
+
+ingredient_index = IngredientIndex()
@@ -0,0 +1,66 @@
+import random
+from statistics import median, quantiles
+from time import perf_counter
+from urllib.parse import quote
+
+from api.filters import IngredienFilter
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from recipes.ingredient_index import FIELDS, current_version, ingredient_index
+from recipes.models import Ingredient
+
+
+def measure(function, queries):
+    timings = []
+    for query in queries:
+        started = perf_counter()
+        function(query)
+        timings.append((perf_counter() - started) * 1000)
+    return median(timings), quantiles(timings, n=100)[98]
+
+
+def search_orm(name):
+    return list(
+        IngredienFilter(
+            {'name': name},
+            queryset=Ingredient.objects.all()
+        ).qs.values(*FIELDS)
+    )
+
+
+class Command(BaseCommand):
+    help = 'Сравнивает задержку поиска ингредиентов через ORM и индекс'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=1000)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        names = list(Ingredient.objects.values_list('name', flat=True))
+        if not names:
+            raise CommandError('Каталог ингредиентов пуст')
+        generator = random.Random(options['seed'])
+        queries = [
+            generator.choice(names)[:generator.randint(1, 4)]
+            for _ in range(options['iterations'])
+        ]
+        ingredient_index.build()
+        version = current_version()
+        client = Client(HTTP_HOST=settings.ALLOWED_HOSTS[0])
+        # В запросе версия каталога уже прочитана для ETag, поэтому индекс
+        # сравнивается с ORM без неё, а эндпоинт замеряется целиком.
+        for label, function in (
+            ('orm', search_orm),
+            ('index', lambda name: ingredient_index.search(name, version)),
+            ('endpoint', lambda name: client.get(
+                f'/api/ingredients/?name={quote(name)}'
+            )),
+        ):
+            p50, p99 = measure(function, queries)
+            self.stdout.write(f'{label}: p50={p50:.3f}ms p99={p99:.3f}ms')
+        with CaptureQueriesContext(connection) as context:
+            client.get(f'/api/ingredients/?name={quote(queries[0])}')
+        self.stdout.write(f'SQL-запросов на поиск: {len(context)}')
@@ -0,0 +1,57 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from recipes.models import Favorite, Ingredient, Recipe, ShoppingCart
+
+
+def hot_queries():
+    return (
+        (
+            'Лента рецептов',
+            Recipe.objects.order_by('-publication_date', '-id')[:6]
+        ),
+        (
+            'Рецепты автора',
+            Recipe.objects.filter(
+                author_id=1
+            ).order_by('-publication_date')[:6]
+        ),
+        (
+            'Рецепты по тегу',
+            Recipe.objects.filter(tags__slug='breakfast')[:6]
+        ),
+        (
+            'Избранное рецепта',
+            Favorite.objects.filter(recipe_id=1)
+        ),
+        (
+            'Корзины с рецептом',
+            ShoppingCart.objects.filter(recipe_id=1)
+        ),
+        (
+            'Поиск ингредиента',
+            Ingredient.objects.filter(name__startswith='аб')
+        ),
+    )
+
+
+class Command(BaseCommand):
+    help = 'Проверяет по EXPLAIN, что горячие запросы используют индексы'
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('Проверка планов доступна только в PostgreSQL')
+        failures = []
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+            for label, queryset in hot_queries():
+                plan = queryset.explain()
+                if 'Seq Scan' in plan:
+                    failures.append(label)
+                    self.stderr.write(f'{label}:\n{plan}')
+                else:
+                    self.stdout.write(f'{label}: OK')
+        if failures:
+            raise CommandError(
+                f'Последовательное сканирование: {", ".join(failures)}'
+            )
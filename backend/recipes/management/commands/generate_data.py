@@ -0,0 +1,173 @@
+import random
+
+from django.apps import apps
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Max
+from recipes import feed_cache, shopping_list
+from recipes.counters import recount
+from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
+                            ShoppingCart, Tag)
+from users.models import Subscription, User
+
+TAGS = (
+    ('Завтрак', '#E26C2D', 'breakfast'),
+    ('Обед', '#49B64E', 'lunch'),
+    ('Ужин', '#8775D2', 'dinner'),
+)
+PASSWORD = 'benchmark-password'
+IMAGE = 'recipes/synthetic.png'
+
+
+def power_law_weights(size, alpha):
+    return [1 / (rank ** alpha) for rank in range(1, size + 1)]
+
+
+def new_pks(model, last_pk):
+    return list(
+        model.objects.filter(pk__gt=last_pk).order_by('pk').values_list(
+            'pk', flat=True
+        )
+    )
+
+
+def last_pk(model):
+    return model.objects.aggregate(last=Max('pk'))['last'] or 0
+
+
+class Command(BaseCommand):
+    help = 'Создаёт синтетические данные для нагрузочного тестирования'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--recipes', type=int, default=10000)
+        parser.add_argument('--favorites', type=int, default=20)
+        parser.add_argument('--carts', type=int, default=5)
+        parser.add_argument('--subscriptions', type=int, default=10)
+        parser.add_argument('--alpha', type=float, default=1.1)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    @transaction.atomic
+    def handle(self, *args, **options):
+        generator = random.Random(options['seed'])
+        batch_size = options['batch_size']
+        ingredient_ids = list(Ingredient.objects.values_list('pk', flat=True))
+        if len(ingredient_ids) < 30:
+            raise CommandError(
+                'Сначала загрузите каталог: manage.py load_ingredients'
+            )
+        for name, color, slug in TAGS:
+            Tag.objects.get_or_create(
+                slug=slug,
+                defaults={'name': name, 'color': color}
+            )
+        tag_ids = list(Tag.objects.values_list('pk', flat=True))
+
+        start = last_pk(User)
+        password = make_password(PASSWORD)
+        User.objects.bulk_create(
+            (
+                User(
+                    username=f'user{start + number}',
+                    email=f'user{start + number}@example.com',
+                    first_name='Имя',
+                    last_name='Фамилия',
+                    password=password
+                )
+                for number in range(1, options['users'] + 1)
+            ),
+            batch_size=batch_size
+        )
+        user_ids = new_pks(User, start)
+        author_weights = power_law_weights(len(user_ids), options['alpha'])
+
+        start = last_pk(Recipe)
+        authors = generator.choices(
+            user_ids,
+            weights=author_weights,
+            k=options['recipes']
+        )
+        Recipe.objects.bulk_create(
+            (
+                Recipe(
+                    author_id=author_id,
+                    name=f'Рецепт {start + number}',
+                    text='Синтетический рецепт для нагрузочного теста',
+                    image=IMAGE,
+                    cooking_time=generator.randint(1, 180)
+                )
+                for number, author_id in enumerate(authors, 1)
+            ),
+            batch_size=batch_size
+        )
+        recipe_ids = new_pks(Recipe, start)
+        RecipeIngredient.objects.bulk_create(
+            (
+                RecipeIngredient(
+                    recipe_id=recipe_id,
+                    ingredient_id=ingredient_id,
+                    amount=generator.randint(2, 500)
+                )
+                for recipe_id in recipe_ids
+                for ingredient_id in generator.sample(
+                    ingredient_ids,
+                    generator.randint(5, 30)
+                )
+            ),
+            batch_size=batch_size
+        )
+        Recipe.tags.through.objects.bulk_create(
+            (
+                Recipe.tags.through(recipe_id=recipe_id, tag_id=tag_id)
+                for recipe_id in recipe_ids
+                for tag_id in generator.sample(
+                    tag_ids,
+                    generator.randint(1, len(tag_ids))
+                )
+            ),
+            batch_size=batch_size
+        )
+
+        recipe_weights = power_law_weights(len(recipe_ids), options['alpha'])
+        for model, per_user in (
+            (Favorite, options['favorites']),
+            (ShoppingCart, options['carts']),
+        ):
+            model.objects.bulk_create(
+                (
+                    model(user_id=user_id, recipe_id=recipe_id)
+                    for user_id in user_ids
+                    for recipe_id in set(generator.choices(
+                        recipe_ids,
+                        weights=recipe_weights,
+                        k=generator.randint(0, per_user)
+                    ))
+                ),
+                batch_size=batch_size,
+                ignore_conflicts=True
+            )
+        Subscription.objects.bulk_create(
+            (
+                Subscription(user_id=user_id, author_id=author_id)
+                for user_id in user_ids
+                for author_id in set(generator.choices(
+                    user_ids,
+                    weights=author_weights,
+                    k=generator.randint(0, options['subscriptions'])
+                ))
+                if author_id != user_id
+            ),
+            batch_size=batch_size,
+            ignore_conflicts=True
+        )
+
+        recount(apps, batch_size=batch_size)
+        shopping_list.rebuild(batch_size=batch_size)
+        Recipe.objects.filter(pk__in=recipe_ids).update_search_vector()
+        feed_cache.catalog_changed()
+        self.stdout.write(
+            f'Создано пользователей: {len(user_ids)}, '
+            f'рецептов: {len(recipe_ids)}. Пароль: {PASSWORD}'
+        )
@@ -0,0 +1,125 @@
+import csv
+import io
+import json
+from itertools import islice
+from pathlib import Path
+from time import perf_counter
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from recipes import feed_cache
+from recipes.models import Ingredient, TableVersion
+
+STAGING_TABLE = 'ingredient_staging'
+
+
+def read_csv(path):
+    with open(path, encoding='utf-8', newline='') as source:
+        for row in csv.reader(source):
+            if len(row) >= 2:
+                yield row[0], row[1]
+
+
+def read_json(path):
+    with open(path, encoding='utf-8') as source:
+        for item in json.load(source):
+            fields = item.get('fields', item)
+            yield fields['name'], fields['measurement_unit']
+
+
+READERS = {
+    '.csv': read_csv,
+    '.json': read_json,
+}
+
+
+def normalize(rows):
+    for name, measurement_unit in rows:
+        name, measurement_unit = name.strip(), measurement_unit.strip()
+        if name and measurement_unit:
+            yield name, measurement_unit
+
+
+def batches(rows, batch_size):
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+class Command(BaseCommand):
+    help = 'Загружает каталог ингредиентов из CSV или JSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Показать новые ингредиенты без записи в базу'
+        )
+
+    def handle(self, *args, **options):
+        path = Path(options['path'])
+        reader = READERS.get(path.suffix.lower())
+        if reader is None:
+            raise CommandError('Поддерживаются только файлы .csv и .json')
+        if not path.exists():
+            raise CommandError(f'Файл {path} не найден')
+        rows = normalize(reader(path))
+        started = perf_counter()
+        if options['dry_run']:
+            total, created = self.diff(rows)
+        else:
+            total, created = self.load(rows, options['batch_size'])
+        elapsed = perf_counter() - started
+        if created and not options['dry_run']:
+            TableVersion.bump(TableVersion.INGREDIENTS)
+            feed_cache.catalog_changed()
+        self.stdout.write(
+            f'Прочитано: {total}, новых: {created}, '
+            f'{total / elapsed if elapsed else total:.0f} строк/с'
+        )
+
+    def diff(self, rows):
+        existing = set(
+            Ingredient.objects.values_list('name', 'measurement_unit')
+        )
+        total, new = 0, set()
+        for row in rows:
+            total += 1
+            if row not in existing:
+                new.add(row)
+        for name, measurement_unit in sorted(new):
+            self.stdout.write(f'+ {name}, {measurement_unit}')
+        return total, len(new)
+
+    @transaction.atomic
+    def load(self, rows, batch_size):
+        table = connection.ops.quote_name(Ingredient._meta.db_table)
+        total = 0
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'CREATE TEMPORARY TABLE {STAGING_TABLE} '
+                '(name varchar(200), measurement_unit varchar(200)) '
+                'ON COMMIT DROP'
+            )
+            for batch in batches(rows, batch_size):
+                buffer = io.StringIO()
+                csv.writer(buffer).writerows(batch)
+                buffer.seek(0)
+                cursor.copy_expert(
+                    f'COPY {STAGING_TABLE} (name, measurement_unit) '
+                    'FROM STDIN WITH (FORMAT csv)',
+                    buffer
+                )
+                total += len(batch)
+            cursor.execute(
+                f'INSERT INTO {table} (name, measurement_unit) '
+                f'SELECT DISTINCT name, measurement_unit FROM {STAGING_TABLE} '
+                'ON CONFLICT (name, measurement_unit) DO NOTHING'
+            )
+            created = cursor.rowcount
+        return total, created
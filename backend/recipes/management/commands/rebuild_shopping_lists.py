@@ -0,0 +1,35 @@
+from math import isclose
+
+from django.core.management.base import BaseCommand, CommandError
+from recipes import shopping_list
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает и сверяет агрегированные списки покупок'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify',
+            action='store_true',
+            help='Только сверить агрегат с живым подсчётом'
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        if not options['verify']:
+            shopping_list.rebuild(batch_size=options['batch_size'])
+        live = shopping_list.live_totals()
+        stored = shopping_list.stored_totals()
+        mismatches = [
+            key for key in live.keys() | stored.keys()
+            if not isclose(live.get(key, 0), stored.get(key, 0))
+        ]
+        for user_id, ingredient_id in mismatches[:20]:
+            self.stderr.write(
+                f'user={user_id} ingredient={ingredient_id}: '
+                f'live={live.get((user_id, ingredient_id))} '
+                f'stored={stored.get((user_id, ingredient_id))}'
+            )
+        if mismatches:
+            raise CommandError(f'Расхождений: {len(mismatches)}')
+        self.stdout.write(f'Агрегат совпадает: {len(stored)} строк')
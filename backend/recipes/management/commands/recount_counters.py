@@ -0,0 +1,14 @@
+from django.apps import apps
+from django.core.management.base import BaseCommand
+from recipes.counters import recount
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает счётчики рецептов и пользователей'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        recount(apps, batch_size=options['batch_size'])
+        self.stdout.write('Счётчики пересчитаны')
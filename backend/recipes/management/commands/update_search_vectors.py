@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = 'Заполняет поисковые векторы рецептов пачками'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Пересчитать векторы у всех рецептов, а не только пустые'
+        )
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.order_by('pk')
+        if not options['all']:
+            recipes = recipes.filter(search_vector__isnull=True)
+        last_pk, updated = 0, 0
+        while True:
+            pks = list(
+                recipes.filter(pk__gt=last_pk).values_list(
+                    'pk', flat=True
+                )[:options['batch_size']]
+            )
+            if not pks:
+                break
+            updated += Recipe.objects.filter(pk__in=pks).update_search_vector()
+            last_pk = pks[-1]
+        self.stdout.write(f'Обновлено рецептов: {updated}')
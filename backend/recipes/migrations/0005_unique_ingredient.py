@@ -0,0 +1,63 @@
+# Generated by Django 3.2.3 on 2026-10-17 10:00
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def merge_rows(model, owner, keep, duplicates):
+    """Переносит строки на оставшийся ингредиент, складывая совпавшие."""
+    for row in model.objects.filter(
+        ingredient_id__in=duplicates
+    ).order_by('pk'):
+        target = model.objects.filter(
+            **{owner: getattr(row, owner)},
+            ingredient_id=keep
+        ).first()
+        if target is None:
+            row.ingredient_id = keep
+            row.save(update_fields=('ingredient',))
+        else:
+            target.amount += row.amount
+            target.save(update_fields=('amount',))
+            row.delete()
+
+
+def merge_duplicate_ingredients(apps, schema_editor):
+    Ingredient = apps.get_model('recipes', 'Ingredient')
+    RecipeIngredient = apps.get_model('recipes', 'RecipeIngredient')
+    ShoppingListItem = apps.get_model('recipes', 'ShoppingListItem')
+    if schema_editor.connection.vendor == 'postgresql':
+        # Отложенные проверки внешних ключей не дали бы AddConstraint
+        # изменить таблицу в той же транзакции.
+        schema_editor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+    groups = Ingredient.objects.values(
+        'name', 'measurement_unit'
+    ).annotate(
+        keep=Min('pk'),
+        total=Count('pk')
+    ).filter(total__gt=1).order_by()
+    for group in list(groups):
+        duplicates = list(Ingredient.objects.filter(
+            name=group['name'],
+            measurement_unit=group['measurement_unit']
+        ).exclude(pk=group['keep']).values_list('pk', flat=True))
+        merge_rows(RecipeIngredient, 'recipe_id', group['keep'], duplicates)
+        merge_rows(ShoppingListItem, 'user_id', group['keep'], duplicates)
+        Ingredient.objects.filter(pk__in=duplicates).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0004_counters'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            merge_duplicate_ingredients, migrations.RunPython.noop
+        ),
+        migrations.AddConstraint(
+            model_name='ingredient',
+            constraint=models.UniqueConstraint(fields=('name', 'measurement_unit'), name='unique_ingredient'),
+        ),
+    ]
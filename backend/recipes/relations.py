@@ -0,0 +1,216 @@
+from django.db import connection, transaction
+from users.models import Subscription, User
+
+from . import shopping_list
+from .counters import change_counters
+from .models import Favorite, Recipe, ShoppingCart
+
+CREATED = 'created'
+DELETED = 'deleted'
+EXISTS = 'exists'
+NOT_FOUND = 'not_found'
+SELF = 'self'
+
+ADD_SQL = """
+    WITH owner AS (
+        SELECT id FROM {users} WHERE id = %(user)s FOR NO KEY UPDATE
+    ), target AS (
+        SELECT id FROM {target} WHERE id = %(pk)s
+    ), inserted AS (
+        INSERT INTO {table} (user_id, {column})
+        SELECT owner.id, target.id FROM owner, target
+        ON CONFLICT DO NOTHING
+        RETURNING id, {column}
+    ), counted AS (
+        UPDATE {target} SET {counter} = {counter} + 1
+        WHERE id IN (SELECT {column} FROM inserted)
+    )
+    SELECT EXISTS (SELECT 1 FROM target), (SELECT id FROM inserted)
+"""
+
+REMOVE_SQL = """
+    WITH owner AS (
+        SELECT id FROM {users} WHERE id = %(user)s FOR NO KEY UPDATE
+    ), deleted AS (
+        DELETE FROM {table}
+        WHERE user_id IN (SELECT id FROM owner) AND {column} = %(pk)s
+        RETURNING {column}
+    ), counted AS (
+        UPDATE {target} SET {counter} = {counter} - 1
+        WHERE id IN (SELECT {column} FROM deleted)
+    )
+    SELECT EXISTS (SELECT 1 FROM deleted)
+"""
+
+
+class Relation:
+    """Связь пользователя с объектом и поддерживаемый счётчик объекта.
+
+    Операции здесь обходят сигналы моделей, поэтому всё, что делают
+    обработчики из signals.py, повторяется явно, одним запросом на пакет
+    или прямо в запросе переключателя.
+    """
+
+    def __init__(self, model, field, target, counter, messages):
+        self.model = model
+        self.field = field
+        self.column = f'{field}_id'
+        self.target = target
+        self.counter = counter
+        self.messages = messages
+
+    def is_allowed(self, user, pk):
+        return True
+
+    def targets(self, user, ids):
+        return {
+            pk for pk in self.target.objects.filter(
+                pk__in=ids
+            ).values_list('pk', flat=True)
+            if self.is_allowed(user, pk)
+        }
+
+    def missing_status(self, user, pk):
+        return NOT_FOUND if self.is_allowed(user, pk) else SELF
+
+    def sql(self, template):
+        quote = connection.ops.quote_name
+        return template.format(
+            users=quote(User._meta.db_table),
+            table=quote(self.model._meta.db_table),
+            column=quote(self.column),
+            target=quote(self.target._meta.db_table),
+            counter=quote(self.counter)
+        )
+
+    def added(self, user, ids):
+        pass
+
+    def removed(self, user, ids):
+        pass
+
+
+class ShoppingCartRelation(Relation):
+
+    def added(self, user, ids):
+        shopping_list.add_recipes(user.pk, ids)
+
+    def removed(self, user, ids):
+        shopping_list.remove_recipes(user.pk, ids)
+
+
+class SubscriptionRelation(Relation):
+
+    def is_allowed(self, user, pk):
+        return pk != user.pk
+
+
+FAVORITES = Relation(
+    Favorite, 'recipe', Recipe, 'favorites_count',
+    {EXISTS: 'Рецепт был добавлен в избранное'}
+)
+SHOPPING_CART = ShoppingCartRelation(
+    ShoppingCart, 'recipe', Recipe, 'in_carts_count',
+    {EXISTS: 'Рецепт был добавлен в список покупок'}
+)
+SUBSCRIPTIONS = SubscriptionRelation(
+    Subscription, 'author', User, 'subscribers_count',
+    {
+        EXISTS: 'The fields user, author must make a unique set.',
+        SELF: 'Нельзя подписаться на самого себя'
+    }
+)
+
+
+def _lock(user):
+    # Пакеты и переключатели одного пользователя (owner в ADD_SQL и
+    # REMOVE_SQL) выполняются по очереди, поэтому набор существующих
+    # связей не меняется между проверкой и записью.
+    User.objects.select_for_update(no_key=True).filter(
+        pk=user.pk
+    ).values_list('pk').get()
+
+
+def _existing(relation, user, ids):
+    return dict(
+        relation.model.objects.filter(
+            user=user,
+            **{f'{relation.column}__in': ids}
+        ).values_list(relation.column, 'pk')
+    )
+
+
+@transaction.atomic
+def add(relation, user, ids):
+    ids = list(dict.fromkeys(ids))
+    _lock(user)
+    found = relation.targets(user, ids)
+    existing = _existing(relation, user, found)
+    new = [pk for pk in ids if pk in found and pk not in existing]
+    relation.model.objects.bulk_create(
+        (
+            relation.model(user=user, **{relation.column: pk})
+            for pk in new
+        ),
+        ignore_conflicts=True
+    )
+    change_counters(relation.target, new, relation.counter, 1)
+    relation.added(user, new)
+    return [
+        (
+            pk,
+            EXISTS if pk in existing
+            else CREATED if pk in found
+            else relation.missing_status(user, pk)
+        )
+        for pk in ids
+    ]
+
+
+@transaction.atomic
+def remove(relation, user, ids):
+    ids = list(dict.fromkeys(ids))
+    _lock(user)
+    existing = _existing(relation, user, ids)
+    relation.removed(user, list(existing))
+    # Одним DELETE ... WHERE id = ANY, без выборки строк и сигналов.
+    if existing:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                relation.sql('DELETE FROM {table} WHERE id = ANY(%s)'),
+                [list(existing.values())]
+            )
+    change_counters(relation.target, list(existing), relation.counter, -1)
+    return [
+        (pk, DELETED if pk in existing else NOT_FOUND)
+        for pk in ids
+    ]
+
+
+def add_one(relation, user, pk):
+    """Создаёт связь одним запросом, возвращает статус и id новой строки.
+
+    Конфликт с уникальным ограничением не поднимает IntegrityError, а
+    превращается в статус EXISTS; счётчик обновляется в том же запросе.
+    """
+    if not relation.is_allowed(user, pk):
+        return SELF, None
+    with connection.cursor() as cursor:
+        cursor.execute(relation.sql(ADD_SQL), {'user': user.pk, 'pk': pk})
+        found, created_id = cursor.fetchone()
+    if created_id is None:
+        return (EXISTS if found else NOT_FOUND), None
+    relation.added(user, [pk])
+    return CREATED, created_id
+
+
+def remove_one(relation, user, pk):
+    with connection.cursor() as cursor:
+        cursor.execute(
+            relation.sql(REMOVE_SQL), {'user': user.pk, 'pk': pk}
+        )
+        (deleted,) = cursor.fetchone()
+    if not deleted:
+        return NOT_FOUND
+    relation.removed(user, [pk])
+    return DELETED
@@ -0,0 +1,131 @@
+from django.db import connection, transaction
+from django.db.models import Sum
+
+from .models import RecipeIngredient, ShoppingCart, ShoppingListItem
+
+# Строка создаётся или дополняется одним атомарным UPSERT, поэтому
+# параллельные изменения одного списка не упираются в уникальное
+# ограничение; пары сортируются, чтобы блокировки брались в одном порядке.
+UPSERT_SQL = """
+    INSERT INTO {table} (user_id, ingredient_id, amount)
+    SELECT * FROM unnest(
+        %s::bigint[], %s::bigint[], %s::double precision[]
+    )
+    ON CONFLICT (user_id, ingredient_id)
+    DO UPDATE SET amount = {table}.amount + EXCLUDED.amount
+"""
+
+CLEANUP_SQL = """
+    DELETE FROM {table}
+    WHERE (user_id, ingredient_id) IN (
+        SELECT * FROM unnest(%s::bigint[], %s::bigint[])
+    ) AND amount <= 0
+"""
+
+
+@transaction.atomic
+def apply_deltas(deltas):
+    items = sorted(
+        (key, delta) for key, delta in deltas.items() if delta
+    )
+    if not items:
+        return
+    user_ids = [user_id for (user_id, _), _ in items]
+    ingredient_ids = [ingredient_id for (_, ingredient_id), _ in items]
+    table = connection.ops.quote_name(ShoppingListItem._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            UPSERT_SQL.format(table=table),
+            [user_ids, ingredient_ids, [delta for _, delta in items]]
+        )
+        cursor.execute(
+            CLEANUP_SQL.format(table=table),
+            [user_ids, ingredient_ids]
+        )
+
+
+def _recipe_deltas(user_id, recipe_ids, sign):
+    return {
+        (user_id, ingredient_id): sign * amount
+        for ingredient_id, amount in RecipeIngredient.objects.filter(
+            recipe_id__in=recipe_ids
+        ).values_list('ingredient_id').annotate(
+            total=Sum('amount')
+        ).order_by()
+    }
+
+
+def add_recipes(user_id, recipe_ids):
+    if recipe_ids:
+        apply_deltas(_recipe_deltas(user_id, recipe_ids, 1))
+
+
+def remove_recipes(user_id, recipe_ids):
+    if recipe_ids:
+        apply_deltas(_recipe_deltas(user_id, recipe_ids, -1))
+
+
+def add_recipe(user_id, recipe_id):
+    add_recipes(user_id, (recipe_id,))
+
+
+def remove_recipe(user_id, recipe_id):
+    remove_recipes(user_id, (recipe_id,))
+
+
+def change_recipe_ingredients(recipe_id, ingredient_deltas):
+    user_ids = ShoppingCart.objects.filter(
+        recipe_id=recipe_id
+    ).values_list('user_id', flat=True)
+    if not ingredient_deltas:
+        return
+    apply_deltas({
+        (user_id, ingredient_id): delta
+        for user_id in user_ids
+        for ingredient_id, delta in ingredient_deltas.items()
+    })
+
+
+def live_totals(user_ids=None):
+    carts = ShoppingCart.objects.all()
+    if user_ids is not None:
+        carts = carts.filter(user_id__in=user_ids)
+    rows = carts.values(
+        'user_id', 'recipe__ingredient__ingredient_id'
+    ).annotate(
+        total=Sum('recipe__ingredient__amount')
+    ).order_by()
+    totals = {}
+    for row in rows.iterator():
+        ingredient_id = row['recipe__ingredient__ingredient_id']
+        if ingredient_id is not None:
+            totals[(row['user_id'], ingredient_id)] = row['total']
+    return totals
+
+
+def stored_totals(user_ids=None):
+    items = ShoppingListItem.objects.all()
+    if user_ids is not None:
+        items = items.filter(user_id__in=user_ids)
+    return {
+        (user_id, ingredient_id): amount
+        for user_id, ingredient_id, amount in items.values_list(
+            'user_id', 'ingredient_id', 'amount'
+        ).iterator()
+    }
+
+
+@transaction.atomic
+def rebuild(batch_size=1000):
+    ShoppingListItem.objects.all().delete()
+    ShoppingListItem.objects.bulk_create(
+        (
+            ShoppingListItem(
+                user_id=user_id,
+                ingredient_id=ingredient_id,
+                amount=amount
+            )
+            for (user_id, ingredient_id), amount in live_totals().items()
+        ),
+        batch_size=batch_size
+    )
@@ -0,0 +1,139 @@
+from django.db.models.signals import (post_delete, post_save, pre_delete,
+                                      pre_save)
+from django.dispatch import receiver
+from django.utils import timezone
+from users.models import User
+
+from . import feed_cache, shopping_list
+from .counters import change_counter, move_counter
+from .models import (Favorite, Ingredient, Recipe, ShoppingCart, TableVersion,
+                     Tag)
+
+# Поля автора, которые попадают в ответы с рецептами.
+AUTHOR_FIELDS = ('email', 'username', 'first_name', 'last_name')
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def bump_ingredients_version(**kwargs):
+    TableVersion.bump(TableVersion.INGREDIENTS)
+    feed_cache.catalog_changed()
+
+
+@receiver((post_save, post_delete), sender=Tag)
+def bump_tags_version(**kwargs):
+    TableVersion.bump(TableVersion.TAGS)
+    feed_cache.catalog_changed()
+
+
+@receiver(pre_save, sender=User)
+def detect_author_change(instance, update_fields=None, **kwargs):
+    instance._author_changed = False
+    if instance._state.adding or (
+        update_fields is not None
+        and not set(update_fields) & set(AUTHOR_FIELDS)
+    ):
+        return
+    old = User.objects.filter(
+        pk=instance.pk,
+        recipes_count__gt=0
+    ).values(*AUTHOR_FIELDS).first()
+    instance._author_changed = old is not None and any(
+        old[field] != getattr(instance, field) for field in AUTHOR_FIELDS
+    )
+
+
+@receiver(post_save, sender=User)
+def invalidate_author_recipes(instance, **kwargs):
+    if instance._author_changed:
+        recipes = Recipe.objects.filter(author_id=instance.pk)
+        recipes.update(updated_at=timezone.now())
+        feed_cache.recipes_changed(recipes.values_list('pk', flat=True))
+
+
+def previous_values(instance, *fields):
+    """Значения полей в БД до сохранения; None для новой строки."""
+    if instance._state.adding:
+        return None
+    return type(instance).objects.filter(
+        pk=instance.pk
+    ).values_list(*fields).first()
+
+
+@receiver(pre_save, sender=ShoppingCart)
+def remember_shopping_cart(instance, **kwargs):
+    instance._previous = previous_values(instance, 'user_id', 'recipe_id')
+
+
+@receiver(post_save, sender=ShoppingCart)
+def add_recipe_to_shopping_list(instance, created, **kwargs):
+    current = (instance.user_id, instance.recipe_id)
+    if instance._previous == current:
+        return
+    # Строку корзины можно отредактировать в админке: рецепт старой
+    # пары уходит из списка покупок, рецепт новой пары добавляется.
+    if instance._previous is not None:
+        shopping_list.remove_recipe(*instance._previous)
+    shopping_list.add_recipe(*current)
+
+
+@receiver(post_save, sender=ShoppingCart)
+def increment_in_carts_count(instance, **kwargs):
+    if instance._previous is None:
+        change_counter(Recipe, instance.recipe_id, 'in_carts_count', 1)
+    else:
+        move_counter(
+            Recipe, 'in_carts_count',
+            instance._previous[1], instance.recipe_id
+        )
+
+
+@receiver(pre_delete, sender=ShoppingCart)
+def remove_recipe_from_shopping_list(instance, **kwargs):
+    shopping_list.remove_recipe(instance.user_id, instance.recipe_id)
+
+
+@receiver(post_delete, sender=ShoppingCart)
+def decrement_in_carts_count(instance, **kwargs):
+    change_counter(Recipe, instance.recipe_id, 'in_carts_count', -1)
+
+
+@receiver(pre_save, sender=Favorite)
+def remember_favorite(instance, **kwargs):
+    instance._previous = previous_values(instance, 'recipe_id')
+
+
+@receiver(post_save, sender=Favorite)
+def increment_favorites_count(instance, **kwargs):
+    if instance._previous is None:
+        change_counter(Recipe, instance.recipe_id, 'favorites_count', 1)
+    else:
+        move_counter(
+            Recipe, 'favorites_count',
+            instance._previous[0], instance.recipe_id
+        )
+
+
+@receiver(post_delete, sender=Favorite)
+def decrement_favorites_count(instance, **kwargs):
+    change_counter(Recipe, instance.recipe_id, 'favorites_count', -1)
+
+
+@receiver(post_save, sender=Recipe)
+def increment_recipes_count(instance, created, **kwargs):
+    if created:
+        change_counter(User, instance.author_id, 'recipes_count', 1)
+
+
+@receiver(post_delete, sender=Recipe)
+def decrement_recipes_count(instance, **kwargs):
+    change_counter(User, instance.author_id, 'recipes_count', -1)
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+def invalidate_recipe_cache(instance, **kwargs):
+    feed_cache.recipe_changed(instance.pk)
+
+
+@receiver(post_save, sender=Recipe)
+def update_search_vector(instance, **kwargs):
+    Recipe.objects.filter(pk=instance.pk).update_search_vector()
@@ -14,7 +14,9 @@ class UserAdmin(admin.ModelAdmin):
         'password',
         'email',
         'first_name',
-        'last_name'
+        'last_name',
+        'recipes_count',
+        'subscribers_count'
     )
     list_filter = ('username', 'email')
     search_fields = ('username', 'email')
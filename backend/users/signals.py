@@ -0,0 +1,27 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from recipes.counters import change_counter, move_counter
+from recipes.signals import previous_values
+
+from .models import Subscription, User
+
+
+@receiver(pre_save, sender=Subscription)
+def remember_subscription(instance, **kwargs):
+    instance._previous = previous_values(instance, 'author_id')
+
+
+@receiver(post_save, sender=Subscription)
+def increment_subscribers_count(instance, **kwargs):
+    if instance._previous is None:
+        change_counter(User, instance.author_id, 'subscribers_count', 1)
+    else:
+        move_counter(
+            User, 'subscribers_count',
+            instance._previous[0], instance.author_id
+        )
+
+
+@receiver(post_delete, sender=Subscription)
+def decrement_subscribers_count(instance, **kwargs):
+    change_counter(User, instance.author_id, 'subscribers_count', -1)